@@ -1,12 +1,13 @@
 import os
 import sys
+import time
 
 import click
 from dotenv import load_dotenv
 from flask_migrate import Migrate, upgrade
 
 from app_core import create_app, db
-from app_core.models import User, Role, Gender, Permission, Follow, Comment, Post
+from app_core.models import User, Role, Gender, Permission, Follow, Comment, Post, TimelineEntry
 
 dot_env_path = os.path.join(os.path.dirname(__file__), '.env')
 if os.path.exists(dot_env_path):
@@ -67,6 +68,44 @@ def profile(length, profile_dir):
     app.run()
 
 
+@app.cli.command()
+@click.option('--chunk-size', default=500, help='Number of rows rendered and written back per batch.')
+@click.option('--processes', default=None, type=int, help='Number of renderer processes, defaults to the CPU count.')
+def rerender(chunk_size, processes):
+    """Re-render posts and comments rendered by an outdated renderer."""
+    from app_core.rendering import rerender_stale
+    for model in (Post, Comment):
+        written = rerender_stale(db.session, model, chunk_size=chunk_size, processes=processes)
+        print('Re-rendered %d %s.' % (written, model.__tablename__))
+
+
+@app.cli.command('render-worker')
+@click.option('--once', is_flag=True, help='Render the posts pending now and exit instead of polling.')
+def render_worker(once):
+    """Render posts whose bodies were too large to render in the request that saved them."""
+    while True:
+        rendered = Post.render_all_pending()
+        db.session.remove()
+        if once:
+            print('Rendered %d posts.' % rendered)
+            break
+        time.sleep(app.config['LICMS_RENDER_POLL_INTERVAL'])
+
+
+@app.cli.command()
+def rebuild_timeline():
+    """Rebuild the materialized home timelines from follows and posts."""
+    TimelineEntry.rebuild()
+
+
+@app.cli.command('reconcile-counters')
+def reconcile():
+    """Recompute the post, comment and follow counters on users and posts."""
+    from app_core.models import reconcile_counters
+    for counter, drifted in reconcile_counters().items():
+        print('Corrected %d rows of %s.' % (drifted, counter))
+
+
 @app.cli.command()
 def deploy():
     """Run deployment tasks."""
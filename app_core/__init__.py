@@ -6,6 +6,16 @@ from flask_moment import Moment
 from flask_pagedown import PageDown
 from flask_sqlalchemy import SQLAlchemy
 
+from app_core.budgets import QueryBudgets
+from app_core.credentials import CredentialCache
+from app_core.leaderboard import Leaderboard
+from app_core.page_cache import PageCache
+from app_core.presence import Presence
+from app_core.principals import PrincipalCache
+from app_core.rate_limit import RateLimiter
+from app_core.reference import ReferenceData
+from app_core.rendering import Renderer
+from app_core.totals import Totals
 from config import config
 
 bootstrap = Bootstrap5()
@@ -13,6 +23,16 @@ mail = Mail()
 moment = Moment()
 db = SQLAlchemy()
 pagedown = PageDown()
+renderer = Renderer()
+budgets = QueryBudgets()
+totals = Totals()
+leaderboard = Leaderboard()
+page_cache = PageCache()
+presence = Presence()
+principals = PrincipalCache()
+credentials = CredentialCache()
+reference = ReferenceData()
+limiter = RateLimiter()
 
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -29,6 +49,16 @@ def create_app(config_name):
     db.init_app(app)
     login_manager.init_app(app)
     pagedown.init_app(app)
+    renderer.init_app(app)
+    totals.init_app(app)
+    leaderboard.init_app(app)
+    page_cache.init_app(app)
+    budgets.init_app(app)
+    presence.init_app(app)
+    principals.init_app(app)
+    credentials.init_app(app)
+    reference.init_app(app)
+    limiter.init_app(app)
 
     if app.config['SSL_REDIRECT']:
         from flask_talisman import Talisman
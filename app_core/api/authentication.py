@@ -1,9 +1,12 @@
-from flask import g, jsonify
+from flask import g, jsonify, request
 from flask_httpauth import HTTPBasicAuth
 
+from app_core import db, principals, credentials, limiter
 from app_core.api import api
 from app_core.api.errors import unauthorized, forbidden
+from app_core.decorators import query_budget
 from app_core.models import User
+from app_core.rate_limit import client_ip, basic_auth_email
 
 auth = HTTPBasicAuth()
 
@@ -13,15 +16,18 @@ def verify_password(email_or_token, password):
     if email_or_token == '':
         return False
     if password == '':
-        g.current_user = User.verify_auth_token(email_or_token)
+        g.current_user = principals.verify_token(email_or_token, read_only=request.method in ('GET', 'HEAD'))
         g.token_used = True
         return g.current_user is not None
     _user = User.query.filter_by(email=email_or_token.lower()).first()
+    if not _user or not credentials.remembers(_user, password):
+        # Only unknown emails and passwords that need the KDF count, calls the caches vouch for are never throttled
+        limiter.check('api.password', 30, 60, (client_ip, basic_auth_email))
     if not _user:
         return False
     g.current_user = _user
     g.token_used = False
-    return _user.verify_password(password)
+    return credentials.verify(_user, password)
 
 
 @auth.error_handler
@@ -38,7 +44,17 @@ def before_request():
 
 
 @api.route('/tokens/', methods=['POST'])
+@query_budget(6)
 def get_token():
     if g.current_user.is_anonymous or g.token_used:
         return unauthorized('Invalid credentials')
     return jsonify({'token': g.current_user.generate_auth_token(expiration=600), 'expiration': 600})
+
+
+@api.route('/tokens/', methods=['DELETE'])
+@query_budget(8)
+def revoke_tokens():
+    _user = db.session.get(User, g.current_user.id)
+    _user.revoke_auth_tokens()
+    db.session.commit()
+    return '', 204
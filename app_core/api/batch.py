@@ -0,0 +1,54 @@
+from flask import request, current_app, jsonify
+
+from app_core import db, budgets
+from app_core.api.errors import bad_request
+from app_core.exceptions import ValidationError
+
+MODES = ('atomic', 'best-effort')
+
+
+def create_batch(build, location):
+    """Create one row per object of the JSON array in the request body, all in a single flush and commit.
+
+    `build` turns an object into an unsaved model, raising ValidationError, and `location` gives the URL of a created
+    row. With ?mode=atomic, the default, one invalid item fails the whole batch and nothing is created; with
+    ?mode=best-effort the valid items are created anyway. The response lists a status for every item in order and
+    is 201 when everything was created, 207 when only some of it was and 400 when nothing was.
+    """
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return bad_request('batch is not a non-empty array')
+    limit = current_app.config['LICMS_API_BATCH_LIMIT']
+    if len(items) > limit:
+        return bad_request('batch has more than %d items' % limit)
+    mode = request.args.get('mode', MODES[0])
+    if mode not in MODES:
+        return bad_request('mode is not one of %s' % ', '.join(MODES))
+
+    results = []
+    created = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValidationError('item is not an object')
+            row = build(item)
+        except ValidationError as e:
+            results.append({'index': index, 'status': 400, 'message': e.args[0]})
+        else:
+            results.append({'index': index, 'status': 201})
+            created.append((index, row))
+
+    failed = len(created) < len(items)
+    if not created or (failed and mode == 'atomic'):
+        for index, _ in created:
+            # Valid, but not created because another item was not
+            results[index]['status'] = 424
+        return jsonify({'results': results}), 400
+    # The ORM can only get the ids of new rows back from SQLite and MySQL one INSERT at a time
+    budgets.allow(len(created))
+    db.session.add_all([row for _, row in created])
+    db.session.flush()
+    for index, row in created:
+        results[index]['location'] = location(row)
+    db.session.commit()
+    return jsonify({'results': results}), 207 if failed else 201
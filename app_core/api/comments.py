@@ -1,25 +1,28 @@
 from flask import jsonify, request, g, url_for, current_app
-from sqlalchemy import asc, desc
+from sqlalchemy import asc
 
-from app_core import db
+from app_core import db, queries, totals
 from app_core.api import api
+from app_core.api.batch import create_batch
+from app_core.api.conditional import conditional, resource_etag, validated, not_modified
 from app_core.api.decorators import permission_required
+from app_core.decorators import query_budget
 from app_core.models import Post, Permission, Comment
+from app_core.pagination import paginate
 
 
 @api.route('/comments/')
+@query_budget(6)
 def get_comments():
-    page = request.args.get('page', 1, type=int)
-    pagination = Comment.query.order_by(desc(Comment.timestamp)).paginate(
-        page=page, per_page=current_app.config['LICMS_COMMENTS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate(queries.comments(authors=False), (Comment.timestamp, Comment.id),
+                          current_app.config['LICMS_COMMENTS_PER_PAGE'], totals_key=('comments', None))
     comments = pagination.items
     _prev = None
-    if pagination.has_prev:
-        _prev = url_for('api.get_comments', page=page - 1, _external=True)
+    if pagination.prev_cursor:
+        _prev = url_for('api.get_comments', cursor=pagination.prev_cursor, _external=True)
     _next = None
-    if pagination.has_next:
-        _next = url_for('api.get_comments', page=page + 1, _external=True)
+    if pagination.next_cursor:
+        _next = url_for('api.get_comments', cursor=pagination.next_cursor, _external=True)
     return jsonify({
         'comments': [comment.to_json() for comment in comments],
         'prev': _prev,
@@ -29,18 +32,27 @@ def get_comments():
 
 
 @api.route('/comments/<int:comment_id>')
+@query_budget(5)
 def get_comment(comment_id):
+    if conditional():
+        updated_at = db.one_or_404(db.select(Comment.updated_at).where(Comment.id == comment_id))
+        response = not_modified(resource_etag('comment', comment_id, updated_at), updated_at)
+        if response is not None:
+            return response
     comment = db.get_or_404(Comment, comment_id)
-    return jsonify(comment.to_json())
+    return validated(jsonify(comment.to_json()), resource_etag('comment', comment.id, comment.updated_at),
+                     comment.updated_at)
 
 
 @api.route('/posts/<int:post_id>/comments/')
+@query_budget(6)
 def get_post_comments(post_id):
     post = db.get_or_404(Post, post_id)
     page = request.args.get('page', 1, type=int)
     pagination = post.comments.order_by(asc(Comment.timestamp)).paginate(
         page=page, per_page=current_app.config['LICMS_COMMENTS_PER_PAGE'],
-        error_out=False)
+        error_out=False, count=False)
+    pagination.total = totals.count(post.comments, 'comments', post_id, post.comment_count)
     comments = pagination.items
     _prev = None
     if pagination.has_prev:
@@ -58,12 +70,29 @@ def get_post_comments(post_id):
 
 @api.route('/posts/<int:post_id>/comments/', methods=['POST'])
 @permission_required(Permission.COMMENT)
+@query_budget(9)
 def new_post_comment(post_id):
     post = db.get_or_404(Post, post_id)
     comment = Comment.from_json(request.json)
-    comment.author = g.current_user
+    comment.author_id = g.current_user.id
     comment.post = post
     db.session.add(comment)
     db.session.commit()
     return jsonify(comment.to_json()), 201, {
         'Location': url_for('api.get_comment', comment_id=comment.id, _external=True)}
+
+
+@api.route('/posts/<int:post_id>/comments/batch', methods=['POST'])
+@permission_required(Permission.COMMENT)
+@query_budget(8)
+def new_post_comments(post_id):
+    post = db.get_or_404(Post, post_id)
+
+    def build(item):
+        comment = Comment.from_json(item)
+        # By id, as assigning the relationships would put rejected comments into the session as well
+        comment.author_id = g.current_user.id
+        comment.post_id = post.id
+        return comment
+
+    return create_batch(build, lambda comment: url_for('api.get_comment', comment_id=comment.id, _external=True))
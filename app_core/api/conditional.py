@@ -0,0 +1,40 @@
+import hashlib
+
+from flask import request, current_app
+from werkzeug.http import is_resource_modified
+
+from app_core.api import api
+
+
+def resource_etag(kind, row_id, *stamps):
+    """A strong ETag for one resource, from its identity and the values that change its representation."""
+    return hashlib.sha1(repr((kind, row_id) + stamps).encode('utf-8')).hexdigest()
+
+
+def validated(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def conditional():
+    """Whether the client sent a copy's validators, only then is checking them worth a query of its own."""
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the client's copy of a resource is still current, or None if it has to be sent."""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return validated(current_app.response_class(status=304), etag, last_modified)
+
+
+@api.after_request
+def add_etag(response):
+    # Collections get an ETag from their body: they are still built in full, but an unchanged page goes out as a 304
+    if request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.is_streamed \
+            and 'ETag' not in response.headers:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
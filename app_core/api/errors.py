@@ -1,4 +1,5 @@
 from flask import jsonify
+from werkzeug.exceptions import TooManyRequests
 
 from app_core.api import api
 from app_core.exceptions import ValidationError
@@ -22,6 +23,18 @@ def forbidden(message):
     return response
 
 
+def too_many_requests(message, retry_after):
+    response = jsonify({'error': 'too many requests', 'message': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
 @api.errorhandler(ValidationError)
 def validation_error(e):
     return bad_request(e.args[0])
+
+
+@api.errorhandler(TooManyRequests)
+def rate_limited(e):
+    return too_many_requests('Rate limit exceeded', e.retry_after)
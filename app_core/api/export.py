@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+
+from flask import request, current_app, abort, stream_with_context
+
+from app_core import db
+from app_core.api import api
+from app_core.api.errors import bad_request
+from app_core.decorators import query_budget
+from app_core.models import Post, Comment, User
+
+
+class Export:
+    def __init__(self, model, timestamp, fields, default, where=()):
+        self.model = model
+        self.timestamp = timestamp
+        self.fields = fields
+        self.default = default
+        self.where = where
+
+
+# Only columns listed here can be exported, which keeps emails, password hashes and 2FA secrets out of the users export
+EXPORTS = {
+    'posts': Export(Post, Post.timestamp,
+                    ('id', 'title', 'body', 'body_html', 'excerpt', 'render_state', 'timestamp', 'author_id',
+                     'comment_count'),
+                    ('id', 'title', 'excerpt', 'timestamp', 'author_id', 'comment_count')),
+    'comments': Export(Comment, Comment.timestamp,
+                       ('id', 'body', 'body_html', 'timestamp', 'author_id', 'post_id'),
+                       ('id', 'body', 'timestamp', 'author_id', 'post_id'),
+                       # The API shows disabled comments as empty objects, an export simply leaves them out
+                       where=(db.or_(Comment.disabled.is_(None), Comment.disabled.is_(False)),)),
+    'users': Export(User, User.member_since,
+                    ('id', 'name', 'location', 'about_me', 'member_since', 'last_seen', 'gender_id', 'post_count',
+                     'comment_count', 'follower_count', 'followed_count'),
+                    ('id', 'name', 'member_since', 'last_seen', 'post_count'))
+}
+
+
+def parse_timestamp(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        value = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # Timestamps are stored as naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+def export_rows(export, fields, since, until, chunk_size):
+    model = export.model
+    columns = [getattr(model, field) for field in fields]
+    if 'id' not in fields:
+        columns.append(model.id)
+    query = db.select(*columns).where(*export.where)
+    if since is not None:
+        query = query.where(export.timestamp >= since)
+    if until is not None:
+        query = query.where(export.timestamp < until)
+    # Walk the primary key in chunks of its own query each, so no cursor or result set outlives a chunk
+    last_id = 0
+    while True:
+        rows = db.session.execute(query.where(model.id > last_id).order_by(model.id).limit(chunk_size)).all()
+        if not rows:
+            return
+        for row in rows:
+            yield current_app.json.dumps(dict(zip(fields, row))) + '\n'
+        last_id = rows[-1].id
+
+
+@api.route('/export/<name>.ndjson')
+@query_budget(6)
+def export(name):
+    _export = EXPORTS.get(name)
+    if _export is None:
+        abort(404)
+    fields = tuple(field for field in request.args.get('fields', '').split(',') if field) or _export.default
+    unknown = set(fields) - set(_export.fields)
+    if unknown:
+        return bad_request('unknown fields: %s' % ', '.join(sorted(unknown)))
+    since, until = parse_timestamp('since'), parse_timestamp('until')
+    if (request.args.get('since') and since is None) or (request.args.get('until') and until is None):
+        return bad_request('since and until must be ISO 8601 timestamps')
+    rows = export_rows(_export, fields, since, until, current_app.config['LICMS_EXPORT_CHUNK_SIZE'])
+    return current_app.response_class(stream_with_context(rows), mimetype='application/x-ndjson')
@@ -1,25 +1,46 @@
 from flask import jsonify, request, g, url_for, current_app
 
-from app_core import db
+from app_core import db, queries
 from app_core.api import api
+from app_core.api.batch import create_batch
+from app_core.api.conditional import conditional, resource_etag, validated, not_modified
 from app_core.api.decorators import permission_required
 from app_core.api.errors import forbidden
+from app_core.decorators import query_budget
 from app_core.models import Post, Permission
+from app_core.pagination import paginate
+
+
+def listing_body():
+    """Whether a post listing sends bodies: it does unless ?body=false, which keeps them out of the query as well."""
+    return request.args.get('body', 'true').lower() not in ('false', '0', 'no')
+
+
+def listing_query(query, body):
+    return query if body else queries.posts(query, authors=False)
+
+
+def listing_args(body):
+    # Carried over into the prev and next links
+    return {} if body else {'body': 'false'}
 
 
 @api.route('/posts/')
+@query_budget(6)
 def get_posts():
-    page = request.args.get('page', 1, type=int)
-    pagination = Post.query.paginate(page=page, per_page=current_app.config['LICMS_POSTS_PER_PAGE'], error_out=False)
+    body = listing_body()
+    pagination = paginate(listing_query(Post.query, body), (Post.timestamp, Post.id),
+                          current_app.config['LICMS_POSTS_PER_PAGE'], totals_key=('posts', None))
     posts = pagination.items
     _prev = None
-    if pagination.has_prev:
-        _prev = url_for('api.get_posts', page=page - 1, _external=True)
+    if pagination.prev_cursor:
+        _prev = url_for('api.get_posts', cursor=pagination.prev_cursor, _external=True, **listing_args(body))
     _next = None
-    if pagination.has_next:
-        _next = url_for('api.get_posts', page=page + 1, _external=True)
+    if pagination.next_cursor:
+        _next = url_for('api.get_posts', cursor=pagination.next_cursor, _external=True, **listing_args(body))
     return jsonify({
-        'posts': [_post.to_json() for _post in posts],
+        'posts': [_post.to_json(include_body=body) for _post in posts],
+        'include_body': body,
         'prev': _prev,
         'next': _next,
         'count': pagination.total
@@ -27,26 +48,47 @@ def get_posts():
 
 
 @api.route('/posts/<int:post_id>')
+@query_budget(5)
 def get_post(post_id):
+    if conditional():
+        # Every change to a post bumps updated_at, so a client's copy can be checked without loading the post
+        updated_at = db.one_or_404(db.select(Post.updated_at).where(Post.id == post_id))
+        response = not_modified(resource_etag('post', post_id, updated_at), updated_at)
+        if response is not None:
+            return response
     _post = db.get_or_404(Post, post_id)
-    return jsonify(_post.to_json())
+    return validated(jsonify(_post.to_json()), resource_etag('post', _post.id, _post.updated_at), _post.updated_at)
 
 
 @api.route('/posts/', methods=['POST'])
 @permission_required(Permission.WRITE)
+@query_budget(8)
 def new_post():
     _post = Post.from_json(request.json)
-    _post.author = g.current_user
+    _post.author_id = g.current_user.id
     db.session.add(_post)
     db.session.commit()
     return jsonify(_post.to_json()), 201, {'Location': url_for('api.get_post', post_id=_post.id, _external=True)}
 
 
+@api.route('/posts/batch', methods=['POST'])
+@permission_required(Permission.WRITE)
+@query_budget(7)
+def new_posts():
+    def build(item):
+        _post = Post.from_json(item)
+        _post.author_id = g.current_user.id
+        return _post
+
+    return create_batch(build, lambda _post: url_for('api.get_post', post_id=_post.id, _external=True))
+
+
 @api.route('/posts/<int:post_id>', methods=['PUT'])
 @permission_required(Permission.WRITE)
+@query_budget(10)
 def edit_post(post_id):
     _post = db.get_or_404(Post, post_id)
-    if g.current_user != _post.author and not g.current_user.is_administrator():
+    if g.current_user.id != _post.author_id and not g.current_user.is_administrator():
         return forbidden('Insufficient permissions')
     _post.title = request.json.get('title', _post.title)
     _post.body = request.json.get('body', _post.body)
@@ -1,32 +1,49 @@
-from flask import jsonify, request, current_app, url_for
-from sqlalchemy import desc
+from flask import jsonify, current_app, url_for, abort
 
-from app_core import db
+from app_core import db, queries
 from app_core.api import api
+from app_core.api.posts import listing_body, listing_query, listing_args
+from app_core.api.conditional import conditional, resource_etag, validated, not_modified
+from app_core.decorators import query_budget
 from app_core.models import User, Post
+from app_core.pagination import paginate
+
+STAMP = (User.name, User.member_since, User.last_seen, User.gender_id, User.post_count)
 
 
 @api.route('/users/<int:user_id>')
+@query_budget(7)
 def get_user(user_id):
-    _user = db.get_or_404(User, user_id)
-    return jsonify(_user.to_json())
+    if conditional():
+        # Users have no modification stamp, their ETag covers the columns User.to_json shows instead
+        stamp = db.session.execute(db.select(*STAMP).where(User.id == user_id)).first()
+        if stamp is None:
+            abort(404)
+        response = not_modified(resource_etag('user', user_id, *stamp))
+        if response is not None:
+            return response
+    _user = queries.users().filter_by(id=user_id).first_or_404()
+    return validated(jsonify(_user.to_json()),
+                     resource_etag('user', _user.id, *(getattr(_user, column.key) for column in STAMP)))
 
 
 @api.route('/users/<int:user_id>/posts/')
+@query_budget(6)
 def get_user_posts(user_id):
     _user = db.get_or_404(User, user_id)
-    page = request.args.get('page', 1, type=int)
-    pagination = _user.posts.order_by(desc(Post.timestamp)).paginate(page=page, per_page=current_app.config[
-        'LICMS_POSTS_PER_PAGE'], error_out=False)
+    body = listing_body()
+    pagination = paginate(listing_query(_user.posts, body), (Post.timestamp, Post.id),
+                          current_app.config['LICMS_POSTS_PER_PAGE'], totals_key=('posts', user_id, _user.post_count))
     posts = pagination.items
     _prev = None
-    if pagination.has_prev:
-        _prev = url_for('api.get_user_posts', user_id=user_id, page=page - 1)
+    if pagination.prev_cursor:
+        _prev = url_for('api.get_user_posts', user_id=user_id, cursor=pagination.prev_cursor, **listing_args(body))
     _next = None
-    if pagination.has_next:
-        _next = url_for('api.get_user_posts', user_id=user_id, page=page + 1)
+    if pagination.next_cursor:
+        _next = url_for('api.get_user_posts', user_id=user_id, cursor=pagination.next_cursor, **listing_args(body))
     return jsonify({
-        'posts': [post.to_json() for post in posts],
+        'posts': [post.to_json(include_body=body) for post in posts],
+        'include_body': body,
         'prev': _prev,
         'next': _next,
         'count': pagination.total
@@ -34,20 +51,25 @@ def get_user_posts(user_id):
 
 
 @api.route('/users/<int:user_id>/timeline/')
+@query_budget(6)
 def get_user_followed_posts(user_id):
     _user = db.get_or_404(User, user_id)
-    page = request.args.get('page', 1, type=int)
-    pagination = _user.followed_posts.order_by(desc(Post.timestamp)).paginate(page=page, per_page=current_app.config[
-        'LICMS_POSTS_PER_PAGE'], error_out=False)
+    body = listing_body()
+    pagination = paginate(listing_query(_user.followed_posts, body), _user.followed_posts_order,
+                          current_app.config['LICMS_POSTS_PER_PAGE'], totals_key=('timeline', user_id),
+                          keys=('timestamp', 'id'))
     posts = pagination.items
     _prev = None
-    if pagination.has_prev:
-        _prev = url_for('api.get_user_followed_posts', user_id=user_id, page=page - 1)
+    if pagination.prev_cursor:
+        _prev = url_for('api.get_user_followed_posts', user_id=user_id, cursor=pagination.prev_cursor,
+                        **listing_args(body))
     _next = None
-    if pagination.has_next:
-        _next = url_for('api.get_user_followed_posts', user_id=user_id, page=page + 1)
+    if pagination.next_cursor:
+        _next = url_for('api.get_user_followed_posts', user_id=user_id, cursor=pagination.next_cursor,
+                        **listing_args(body))
     return jsonify({
-        'posts': [post.to_json() for post in posts],
+        'posts': [post.to_json(include_body=body) for post in posts],
+        'include_body': body,
         'prev': _prev,
         'next': _next,
         'count': pagination.total
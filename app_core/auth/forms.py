@@ -2,7 +2,8 @@ from flask_wtf import FlaskForm
 from wtforms.fields import StringField, PasswordField, BooleanField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
 
-from app_core.models import User, Gender
+from app_core import reference
+from app_core.models import User
 
 
 class LoginForm(FlaskForm):
@@ -23,7 +24,7 @@ class RegistrationForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(RegistrationForm, self).__init__(*args, **kwargs)
-        self.gender.choices = [(gender.id, gender.name) for gender in Gender.query.all()]
+        self.gender.choices = reference.gender_choices()
 
     def validate_email(self, field):
         if User.query.filter_by(email=field.data.lower()).first():
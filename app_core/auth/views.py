@@ -10,8 +10,10 @@ from app_core import db
 from app_core.auth import auth
 from app_core.auth.forms import LoginForm, RegistrationForm, ChangePasswordFrom, PasswordResetRequestForm, \
     PasswordResetForm, ChangeEmailForm, TwoFactorForm, TwoFactorResetForm
+from app_core.decorators import rate_limit
 from app_core.email import send_email
-from app_core.models import User, Gender
+from app_core.models import User
+from app_core.rate_limit import client_ip, form_email, session_email
 
 
 @auth.before_app_request
@@ -38,6 +40,7 @@ def unconfirmed():
 
 
 @auth.route('/login', methods=['GET', 'POST'])
+@rate_limit('auth.login', 10, 60, keys=(client_ip, form_email))
 def login():
     if not current_user.is_anonymous:
         flash("You've already logged in.", 'alert-info')
@@ -46,6 +49,8 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data.lower()).first()
         if user is not None and user.verify_password(form.password.data):
+            if user.rehash_password(form.password.data):
+                db.session.commit()
             # Do NOT put user_id into the session, in case you want to log the user in.
             session['email'] = user.email
             _next = request.args.get('next')
@@ -55,6 +60,7 @@ def login():
 
 
 @auth.route('/two-factor', methods=['GET', 'POST'])
+@rate_limit('auth.two_factor', 10, 60, keys=(client_ip, session_email))
 def two_factor():
     if 'email' not in session:
         abort(404)
@@ -94,7 +100,7 @@ def register():
             email=form.email.data.lower(),
             name=form.name.data,
             password=form.password.data,
-            gender=db.session.get(Gender, form.gender.data)
+            gender_id=form.gender.data
         )
         token = user.generate_confirmation_token()
         send_email(user.email, 'Confirm Your Account', 'auth/email/confirm', user=user, token=token,
@@ -161,6 +167,7 @@ def change_two_factor():
 
 
 @auth.route('/reset-2FA', methods=['GET', 'POST'])
+@rate_limit('auth.tow_factor_reset_request', 5, 900, keys=(client_ip, form_email))
 def tow_factor_reset_request():
     if not current_user.is_anonymous:
         flash("Since you have access to your 2FA, you don't need to reset it. You can change it directly.",
@@ -238,6 +245,7 @@ def change_password():
 
 
 @auth.route('/reset', methods=['GET', 'POST'])
+@rate_limit('auth.password_reset_request', 5, 900, keys=(client_ip, form_email))
 def password_reset_request():
     if not current_user.is_anonymous:
         flash("Since you know your current password, you don't need to reset it. You can change it directly.",
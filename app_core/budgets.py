@@ -0,0 +1,62 @@
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app_core.exceptions import QueryBudgetExceeded
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+class QueryBudgets:
+    """Count the SQL statements each request runs and complain when an endpoint goes over its budget.
+
+    Budgets come from the @query_budget decorator on a view, overridden by the LICMS_QUERY_BUDGETS map of endpoint
+    names. LICMS_QUERY_BUDGET_MODE decides what an overage does: 'log' a warning, 'raise' QueryBudgetExceeded, or
+    nothing when unset. Individually fast queries that pile up per row never show up in the slow-query log, this does.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not event.contains(Engine, 'before_cursor_execute', count_statement):
+            event.listen(Engine, 'before_cursor_execute', count_statement)
+        app.before_request(self.reset)
+        app.after_request(self.check)
+
+    @staticmethod
+    def reset():
+        g.query_count = 0
+        g.query_allowance = 0
+
+    @staticmethod
+    def allow(count):
+        """Let this request run `count` statements over its endpoint's budget, for work that scales with its input."""
+        g.query_allowance = g.get('query_allowance', 0) + count
+
+    @staticmethod
+    def budget_for(endpoint):
+        budgets = current_app.config['LICMS_QUERY_BUDGETS']
+        if endpoint in budgets:
+            return budgets[endpoint]
+        view = current_app.view_functions.get(endpoint)
+        return getattr(view, 'query_budget', None)
+
+    def check(self, response):
+        mode = current_app.config['LICMS_QUERY_BUDGET_MODE']
+        if not mode or request.endpoint is None:
+            return response
+        budget = self.budget_for(request.endpoint)
+        count = g.get('query_count', 0)
+        if budget is not None:
+            budget += g.get('query_allowance', 0)
+        if budget is not None and count > budget:
+            message = '%s %s ran %d queries, its budget is %d' % (request.method, request.endpoint, count, budget)
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            current_app.logger.warning('Query budget exceeded: ' + message)
+        return response
@@ -0,0 +1,56 @@
+import hashlib
+import hmac
+import os
+
+from app_core.cache import LRUCache
+
+
+class CredentialCache:
+    """Recently verified passwords of HTTP Basic API clients, so they don't pay for the password KDF on every call.
+
+    Only a keyed HMAC of (user id, stored password hash, password) is kept, under a key generated per process and
+    never written anywhere, so neither the cache nor a dump of it gives away a password. Binding the stored hash
+    into the digest means a changed password stops matching in every worker straight away; setting a password also
+    drops the entry here. Failed attempts are never remembered and always go through the KDF.
+    """
+
+    def __init__(self, app=None):
+        self.cache = LRUCache()
+        self.key = os.urandom(32)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache.maxsize = app.config['LICMS_CREDENTIAL_CACHE_SIZE']
+        self.cache.ttl = app.config['LICMS_CREDENTIAL_CACHE_TTL']
+        self.cache.clear()
+
+    def digest(self, user, password):
+        message = b'\0'.join((str(user.id).encode('ascii'), user.password_hash.encode('utf-8'),
+                              password.encode('utf-8')))
+        return hmac.new(self.key, message, hashlib.sha256).digest()
+
+    def remembers(self, user, password):
+        """Whether `password` was recently verified for `user`, so checking it again won't run the KDF."""
+        if user.id is None or user.password_hash is None:
+            return False
+        remembered = self.cache.get(user.id)
+        return remembered is not None and hmac.compare_digest(remembered, self.digest(user, password))
+
+    def verify(self, user, password):
+        from app_core import db
+
+        if user.id is None or user.password_hash is None:
+            return user.verify_password(password)
+        if self.remembers(user, password):
+            return True
+        if not user.verify_password(password):
+            return False
+        if user.rehash_password(password):
+            db.session.commit()
+        self.cache.set(user.id, self.digest(user, password))
+        return True
+
+    def forget(self, user_id):
+        if user_id is not None:
+            self.cache.delete(user_id)
@@ -1,9 +1,11 @@
 from functools import wraps
 
-from flask import abort
+from flask import abort, request
 from flask_login import current_user
 
+from app_core import limiter
 from app_core.models import Permission
+from app_core.rate_limit import client_ip
 
 
 def permission_required(permission):
@@ -21,3 +23,26 @@ def permission_required(permission):
 
 def admin_required(func):
     return permission_required(Permission.ADMIN)(func)
+
+
+def query_budget(budget):
+    """Declare how many SQL statements a request to this view may run, see app_core.budgets."""
+    def decorator(func):
+        func.query_budget = budget
+        return func
+
+    return decorator
+
+
+def rate_limit(scope, limit, period, keys=(client_ip,), methods=('POST',)):
+    """Allow `limit` requests per `period` seconds for each key of a request to this view, see app_core.rate_limit."""
+    def decorator(func):
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            if request.method in methods:
+                limiter.check(scope, limit, period, keys)
+            return func(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
@@ -1,5 +1,8 @@
-from flask import current_app, abort, request
+from flask import current_app, abort, request, render_template
+from flask_login import login_required
 
+from app_core import renderer, totals, leaderboard, page_cache, principals
+from app_core.decorators import admin_required
 from app_core.dev_ops import dev_ops
 
 
@@ -12,3 +15,18 @@ def server_shutdown():
         abort(500)
     shutdown()
     return 'Shutting down...'
+
+
+@dev_ops.route('/cache')
+@login_required
+@admin_required
+def cache_stats():
+    caches = [
+        ('Pages', page_cache.cache.stats()),
+        ('Rendered Markdown', renderer.cache.stats()),
+        ('Highlighted Code', renderer.highlight_cache.stats()),
+        ('Listing Totals', totals.cache.stats()),
+        ('Leaderboard', leaderboard.cache.stats()),
+        ('API Principals', principals.cache.stats())
+    ]
+    return render_template('dev_ops/cache.html', caches=caches)
@@ -0,0 +1,56 @@
+from flask import g
+from flask_login import current_user
+from sqlalchemy import and_, or_, select
+
+from app_core import db
+from app_core.models import Follow
+
+
+class FollowState:
+    """How the current user and a set of other users follow each other, fetched once per request.
+
+    load() looks up every user of a page in a single IN query on follows, in both directions, and the is_* checks are
+    then answered from memory. A user that was not loaded up front is looked up on its own the first time it is asked
+    about, so templates stay correct however they are reached.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.known = set()
+        self.following = set()
+        self.followers = set()
+
+    def load(self, users):
+        ids = {user.id for user in users if user.id is not None} - self.known
+        if self.user_id is None or not ids:
+            return self
+        rows = db.session.execute(select(Follow.follower_id, Follow.followed_id).where(or_(
+            and_(Follow.follower_id == self.user_id, Follow.followed_id.in_(ids)),
+            and_(Follow.followed_id == self.user_id, Follow.follower_id.in_(ids))))).all()
+        for follower_id, followed_id in rows:
+            if follower_id == self.user_id:
+                self.following.add(followed_id)
+            if followed_id == self.user_id:
+                self.followers.add(follower_id)
+        self.known |= ids
+        return self
+
+    def is_following(self, user):
+        self.load([user])
+        return user.id in self.following
+
+    def is_followed_by(self, user):
+        self.load([user])
+        return user.id in self.followers
+
+
+def follow_state():
+    user_id = current_user.id if current_user.is_authenticated else None
+    state = g.get('follow_state')
+    if state is None or state.user_id != user_id:
+        state = g.follow_state = FollowState(user_id)
+    return state
+
+
+def reset_follow_state():
+    g.pop('follow_state', None)
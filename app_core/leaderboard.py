@@ -0,0 +1,36 @@
+from app_core.cache import LRUCache
+
+
+class Leaderboard:
+    """The authors with the most posts, for the index page.
+
+    Ranking reads the indexed users.post_count counter instead of grouping the posts table, and the ranked ids are
+    kept in process until a post is inserted or deleted here, or LICMS_LEADERBOARD_TTL runs out for changes made by
+    other workers.
+    """
+
+    def __init__(self, app=None):
+        self.cache = LRUCache(maxsize=8)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache.ttl = app.config['LICMS_LEADERBOARD_TTL']
+        self.cache.clear()
+
+    def top(self, k):
+        from app_core import db, queries
+        from app_core.models import User
+
+        ids = self.cache.get(k)
+        if ids is None:
+            ids = db.session.execute(db.select(User.id).where(User.post_count > 0).order_by(
+                User.post_count.desc(), User.id).limit(k)).scalars().all()
+            self.cache.set(k, ids)
+        if not ids:
+            return []
+        users = {user.id: user for user in queries.users().filter(User.id.in_(ids))}
+        return [users[user_id] for user_id in ids if user_id in users]
+
+    def invalidate(self):
+        self.cache.delete_matching(lambda key: True)
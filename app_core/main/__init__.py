@@ -3,9 +3,19 @@ from flask import Blueprint
 main = Blueprint('main', __name__)
 
 from app_core.main import views, errors
+from app_core.follow_state import follow_state, reset_follow_state
 from app_core.models import Permission
 
 
 @main.app_context_processor
 def inject_permission():
     return dict(Permission=Permission)
+
+
+@main.app_context_processor
+def inject_follow_state():
+    return dict(follow_state=follow_state)
+
+
+# Follows change between requests, so the lookups of one request are never reused by the next
+main.before_app_request(reset_follow_state)
@@ -23,6 +23,18 @@ def page_not_found(_):
     return render_template('errors/404.html'), 404
 
 
+@main.app_errorhandler(429)
+def too_many_requests(e):
+    headers = {'Retry-After': str(e.retry_after)} if e.retry_after is not None else {}
+    if request.accept_mimetypes.accept_json and \
+            not request.accept_mimetypes.accept_html:
+        response = jsonify({'error': 'too many requests'})
+        response.status_code = 429
+        response.headers.update(headers)
+        return response
+    return render_template('errors/429.html', retry_after=e.retry_after), 429, headers
+
+
 @main.app_errorhandler(500)
 def internal_server_error(_):
     if request.accept_mimetypes.accept_json and \
@@ -3,7 +3,8 @@ from flask_wtf import FlaskForm
 from wtforms.fields import StringField, TextAreaField, SubmitField, SelectField, BooleanField, DateTimeLocalField
 from wtforms.validators import Length, DataRequired, Email, ValidationError, Optional
 
-from app_core.models import Gender, Role, User
+from app_core import reference
+from app_core.models import User
 
 
 class EditProfileForm(FlaskForm):
@@ -15,7 +16,7 @@ class EditProfileForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(EditProfileForm, self).__init__(*args, **kwargs)
-        self.gender.choices = [(gender.id, gender.name) for gender in Gender.query.all()]
+        self.gender.choices = reference.gender_choices()
 
 
 class EditProfileAdminForm(FlaskForm):
@@ -30,8 +31,8 @@ class EditProfileAdminForm(FlaskForm):
 
     def __init__(self, user, *args, **kwargs):
         super(EditProfileAdminForm, self).__init__(*args, **kwargs)
-        self.role.choices = [(role.id, role.name) for role in Role.query.order_by(Role.name).all()]
-        self.gender.choices = [(gender.id, gender.name) for gender in Gender.query.all()]
+        self.role.choices = reference.role_choices()
+        self.gender.choices = reference.gender_choices()
         self.user = user
 
     def validate_email(self, field):
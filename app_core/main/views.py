@@ -3,13 +3,15 @@ from datetime import datetime, timezone
 from flask import render_template, redirect, url_for, flash, request, current_app, abort, make_response
 from flask_login import login_required, current_user
 from flask_sqlalchemy import record_queries
-from sqlalchemy import asc, desc, func
+from sqlalchemy import asc, desc
 
-from app_core import db
-from app_core.decorators import admin_required, permission_required
+from app_core import db, queries, totals, leaderboard, page_cache
+from app_core.decorators import admin_required, permission_required, query_budget
+from app_core.follow_state import follow_state
 from app_core.main import main
 from app_core.main.forms import EditProfileForm, EditProfileAdminForm, PostForm, CommentForm, PasteForm
-from app_core.models import User, Role, Permission, Post, Gender, Follow, Comment, Paste
+from app_core.models import User, Permission, Post, Follow, Comment, Paste
+from app_core.pagination import paginate
 
 
 @main.after_app_request
@@ -22,11 +24,14 @@ def after_request(response):
 
 
 @main.route('/favicon.ico')
+@query_budget(2)
 def favicon():
     return redirect(url_for('static', filename='favicon.ico', _external=True))
 
 
 @main.route('/', methods=['GET', 'POST'])
+@page_cache
+@query_budget(10)
 def index():
     _show_followed = False
     if current_user.is_authenticated:
@@ -35,44 +40,47 @@ def index():
         post_title = 'Latest Followed Posts'
         post_link = 'Show All Followed Posts'
         query = current_user.followed_posts
+        order = current_user.followed_posts_order
     else:
         post_title = 'Latest Posts'
         post_link = 'Show All Posts'
         query = Post.query
-    _posts = query.order_by(desc(Post.timestamp)).limit(8).all()
-    post_count_sub = Post.query.group_by(Post.author_id).with_entities(Post.author_id, func.count(Post.author_id).label(
-        'post_count')).subquery()
-    _users = db.session.query(User).join(post_count_sub, User.id == post_count_sub.c.author_id).order_by(
-        desc(post_count_sub.c.post_count)).limit(8).all()
+        order = Post.timestamp, Post.id
+    _posts = queries.posts(query).order_by(*[desc(column) for column in order]).limit(8).all()
+    _users = leaderboard.top(8)
+    follow_state().load(_users)
     return render_template('index.html', current_time=datetime.now(timezone.utc), show_followed=_show_followed,
                            posts=_posts, post_title=post_title, post_link=post_link, users=_users,
                            endpoint='main.index')
 
 
 @main.route('/user', methods=['GET', 'POST'])
+@query_budget(6)
 def users():
-    page = request.args.get('page', 1, type=int)
-    pagination = User.query.order_by(desc(User.member_since)).paginate(page=page, per_page=current_app.config[
-        'LICMS_USERS_PER_PAGE'], error_out=False)
+    pagination = paginate(queries.users(), (User.member_since, User.id), current_app.config['LICMS_USERS_PER_PAGE'])
     _users = pagination.items
+    follow_state().load(_users)
     return render_template('users.html', title="All authors", users=_users, pagination=pagination,
                            endpoint='main.users')
 
 
 @main.route('/user/<int:user_id>')
+@page_cache
+@query_budget(8)
 def user(user_id):
-    _user = User.query.filter_by(id=user_id).first_or_404()
-    _posts = _user.posts.order_by(desc(Post.timestamp)).all()
+    _user = queries.users().filter_by(id=user_id).first_or_404()
+    _posts = queries.posts(_user.posts).order_by(desc(Post.timestamp)).all()
     return render_template('user.html', user=_user, posts=_posts)
 
 
 @main.route('/user/edit', methods=['GET', 'POST'])
 @login_required
+@query_budget(8)
 def edit_profile():
     form = EditProfileForm()
     if form.validate_on_submit():
         current_user.name = form.name.data
-        current_user.gender = Gender.query.get(form.gender.data)
+        current_user.gender_id = form.gender.data
         current_user.location = form.location.data
         current_user.about_me = form.about_me.data
         db.session.add(current_user)
@@ -89,15 +97,16 @@ def edit_profile():
 @main.route('/user/<int:user_id>/edit', methods=['GET', 'POST'])
 @login_required
 @admin_required
+@query_budget(10)
 def edit_profile_admin(user_id):
     _user = db.get_or_404(User, user_id)
     form = EditProfileAdminForm(user=_user)
     if form.validate_on_submit():
         _user.email = form.email.data
         _user.confirmed = form.confirmed.data
-        _user.role = Role.query.get(form.role.data)
+        _user.role_id = form.role.data
         _user.name = form.name.data
-        _user.gender = Gender.query.get(form.gender.data)
+        _user.gender_id = form.gender.data
         _user.location = form.location.data
         _user.about_me = form.about_me.data
         db.session.add(_user)
@@ -116,6 +125,7 @@ def edit_profile_admin(user_id):
 
 @main.route('/all/<_next>')
 @login_required
+@query_budget(1)
 def show_all(_next):
     resp = make_response(redirect(url_for(_next)))
     resp.set_cookie('show_followed', '', max_age=30 * 24 * 60 * 60)
@@ -124,6 +134,7 @@ def show_all(_next):
 
 @main.route('/followed/<_next>')
 @login_required
+@query_budget(1)
 def show_followed(_next):
     resp = make_response(redirect(url_for(_next)))
     resp.set_cookie('show_followed', 'True', max_age=30 * 24 * 60 * 60)
@@ -131,6 +142,8 @@ def show_followed(_next):
 
 
 @main.route('/post', methods=['GET', 'POST'])
+@page_cache
+@query_budget(12)
 def posts():
     form = PostForm()
     if current_user.can(Permission.WRITE) and form.validate_on_submit():
@@ -144,21 +157,23 @@ def posts():
     if _show_followed:
         title = 'Followed Posts'
         query = current_user.followed_posts
+        order = current_user.followed_posts_order
     else:
         title = 'All Posts'
         query = Post.query
-    page = request.args.get('page', 1, type=int)
-    pagination = query.order_by(desc(Post.timestamp)).paginate(page=page,
-                                                               per_page=current_app.config['LICMS_POSTS_PER_PAGE'],
-                                                               error_out=False)
+        order = Post.timestamp, Post.id
+    pagination = paginate(queries.posts(query), order, current_app.config['LICMS_POSTS_PER_PAGE'],
+                          keys=('timestamp', 'id'))
     _posts = pagination.items
     return render_template('posts.html', title=title, form=form, show_followed=_show_followed, posts=_posts,
                            pagination=pagination, endpoint='main.posts')
 
 
 @main.route('/post/<int:post_id>', methods=['GET', 'POST'])
+@page_cache
+@query_budget(12)
 def post(post_id):
-    _post = db.get_or_404(Post, post_id)
+    _post = queries.post(post_id).first_or_404()
     form = CommentForm()
     if current_user.can(Permission.COMMENT) and form.validate_on_submit():
         comment = Comment(body=form.body.data, post=_post, author=current_user)
@@ -168,10 +183,12 @@ def post(post_id):
         # page=-1 takes you to the last page that contains your comment
         return redirect(url_for('main.post', post_id=post_id, page=-1))
     page = request.args.get('page', 1, type=int)
+    total = totals.count(_post.comments, 'comments', post_id, _post.comment_count)
     if page == -1:
-        page = ((_post.comments.count() - 1) // current_app.config['LICMS_COMMENTS_PER_PAGE']) + 1
-    pagination = _post.comments.order_by(asc(Comment.timestamp)).paginate(page=page, per_page=current_app.config[
-        'LICMS_COMMENTS_PER_PAGE'], error_out=False)
+        page = ((total - 1) // current_app.config['LICMS_COMMENTS_PER_PAGE']) + 1
+    pagination = queries.comments(_post.comments).order_by(asc(Comment.timestamp)).paginate(
+        page=page, per_page=current_app.config['LICMS_COMMENTS_PER_PAGE'], error_out=False, count=False)
+    pagination.total = total
     _comments = pagination.items
     return render_template('post.html', post=_post, form=form, comments=_comments, pagination=pagination,
                            endpoint='main.post', page=page, sample=page)
@@ -179,6 +196,7 @@ def post(post_id):
 
 @main.route('/post/<int:post_id>/edit', methods=['GET', 'POST'])
 @login_required
+@query_budget(8)
 def edit(post_id):
     _post = db.get_or_404(Post, post_id)
     if current_user != _post.author and not current_user.is_administrator():
@@ -199,6 +217,7 @@ def edit(post_id):
 @main.route('/follow/<int:user_id>', methods=['POST'])
 @login_required
 @permission_required(Permission.FOLLOW)
+@query_budget(12)
 def follow(user_id):
     _user = User.query.filter_by(id=user_id).first()
     if _user is None:
@@ -215,6 +234,7 @@ def follow(user_id):
 @main.route('/unfollow/<int:user_id>', methods=['POST'])
 @login_required
 @permission_required(Permission.FOLLOW)
+@query_budget(12)
 def unfollow(user_id):
     _user = User.query.filter_by(id=user_id).first()
     if _user is None:
@@ -229,34 +249,38 @@ def unfollow(user_id):
 
 
 @main.route('/followers/<int:user_id>')
+@query_budget(6)
 def followers(user_id):
     _user = User.query.get(user_id)
     if _user is None:
         flash('Invalid user.', 'alert-danger')
         return redirect(url_for('main.index'))
-    page = request.args.get('page', 1, type=int)
-    pagination = _user.followers.order_by(desc(Follow.timestamp)).paginate(page=page, per_page=current_app.config[
-        'LICMS_USERS_PER_PAGE'], error_out=False)
+    pagination = paginate(queries.followers(_user.followers), (Follow.timestamp, Follow.follower_id),
+                          current_app.config['LICMS_USERS_PER_PAGE'])
     _followers = [item.follower for item in pagination.items if item.follower != _user]
+    follow_state().load(_followers)
     return render_template('users.html', title="Followers of " + _user.name, users=_followers, pagination=pagination,
                            endpoint='main.followers', user_id=user_id)
 
 
 @main.route('/followed_by/<int:user_id>')
+@query_budget(6)
 def followed_by(user_id):
     _user = User.query.get(user_id)
     if _user is None:
         flash('Invalid user.', 'alert-danger')
         return redirect(url_for('main.index'))
-    page = request.args.get('page', 1, type=int)
-    pagination = _user.followed.order_by(desc(Follow.timestamp)).paginate(page=page, per_page=current_app.config[
-        'LICMS_USERS_PER_PAGE'], error_out=False)
+    pagination = paginate(queries.followed(_user.followed), (Follow.timestamp, Follow.followed_id),
+                          current_app.config['LICMS_USERS_PER_PAGE'])
     _followed = [item.followed for item in pagination.items if item.followed != _user]
+    follow_state().load(_followed)
     return render_template('users.html', title="Users followed by " + _user.name, users=_followed,
                            pagination=pagination, endpoint='main.followed_by', user_id=user_id)
 
 
 @main.route('/about')
+@page_cache
+@query_budget(2)
 def about():
     return render_template('about.html')
 
@@ -264,49 +288,52 @@ def about():
 @main.route('/moderate')
 @login_required
 @permission_required(Permission.MODERATE)
+@query_budget(4)
 def moderate():
-    page = request.args.get('page', 1, type=int)
-    pagination = Comment.query.order_by(desc(Comment.timestamp)).paginate(page=page, per_page=current_app.config[
-        'LICMS_COMMENTS_PER_PAGE'], error_out=False)
+    pagination = paginate(queries.comments(), (Comment.timestamp, Comment.id),
+                          current_app.config['LICMS_COMMENTS_PER_PAGE'])
     _comments = pagination.items
     return render_template('moderate.html', comments=_comments, pagination=pagination, endpoint='main.moderate',
-                           page=page)
+                           page=request.args.get('page', type=int), cursor=request.args.get('cursor'))
 
 
 @main.route('/moderate/enable/<int:comment_id>')
 @login_required
 @permission_required(Permission.MODERATE)
+@query_budget(7)
 def moderate_enable(comment_id):
     _comment = db.get_or_404(Comment, comment_id)
     _comment.disabled = False
     db.session.add(_comment)
     db.session.commit()
     in_post = request.args.get('in_post', False, type=lambda v: v.lower() == 'true')
-    page = request.args.get('page', 1, type=int)
+    page = request.args.get('page', type=int)
     if in_post:
-        return redirect(url_for('main.post', post_id=_comment.post_id, page=page))
+        return redirect(url_for('main.post', post_id=_comment.post_id, page=page or 1))
     else:
-        return redirect(url_for('main.moderate', page=page))
+        return redirect(url_for('main.moderate', page=page, cursor=request.args.get('cursor')))
 
 
 @main.route('/moderate/disable/<int:comment_id>')
 @login_required
 @permission_required(Permission.MODERATE)
+@query_budget(5)
 def moderate_disable(comment_id):
     _comment = db.get_or_404(Comment, comment_id)
     _comment.disabled = True
     db.session.add(_comment)
     db.session.commit()
     in_post = request.args.get('in_post', False, type=lambda v: v.lower() == 'true')
-    page = request.args.get('page', 1, type=int)
+    page = request.args.get('page', type=int)
     if in_post:
-        return redirect(url_for('main.post', post_id=_comment.post_id, page=page))
+        return redirect(url_for('main.post', post_id=_comment.post_id, page=page or 1))
     else:
-        return redirect(url_for('main.moderate', page=page))
+        return redirect(url_for('main.moderate', page=page, cursor=request.args.get('cursor')))
 
 
 @main.route('/paste', methods=['GET', 'POST'])
 @login_required
+@query_budget(10)
 def pastes():
     form = PasteForm()
     if current_user.can(Permission.WRITE) and form.validate_on_submit():
@@ -317,14 +344,16 @@ def pastes():
         flash('The paste has been posted.', 'alert-success')
         return redirect(url_for('main.paste', paste_id=_paste.id))
     page = request.args.get('page', 1, type=int)
-    pagination = current_user.pastes.order_by(desc(Paste.timestamp)).paginate(page=page, per_page=current_app.config[
-        'LICMS_PASTES_PER_PAGE'], error_out=False)
+    pagination = queries.pastes(current_user.pastes).order_by(desc(Paste.timestamp)).paginate(
+        page=page, per_page=current_app.config['LICMS_PASTES_PER_PAGE'], error_out=False, count=False)
+    pagination.total = totals.count(current_user.pastes, 'pastes', current_user.id)
     _pastes = pagination.items
     return render_template('pastes.html', title="My Pastes", form=form, pastes=_pastes, pagination=pagination,
                            endpoint='main.pastes')
 
 
 @main.route('/paste/<int:paste_id>', methods=['GET'])
+@query_budget(4)
 def paste(paste_id):
     _paste = db.get_or_404(Paste, paste_id)
     if _paste.author != current_user and not current_user.is_administrator():
@@ -337,6 +366,7 @@ def paste(paste_id):
 
 @main.route('/paste/edit/<int:paste_id>', methods=['GET', 'POST'])
 @login_required
+@query_budget(8)
 def edit_paste(paste_id):
     _paste = db.get_or_404(Paste, paste_id)
     if current_user != _paste.author and not current_user.is_administrator():
@@ -361,10 +391,12 @@ def edit_paste(paste_id):
 @main.route('/paste/moderate')
 @login_required
 @permission_required(Permission.MODERATE)
+@query_budget(5)
 def moderate_pastes():
     page = request.args.get('page', 1, type=int)
-    pagination = Paste.query.order_by(desc(Paste.timestamp)).paginate(page=page, per_page=current_app.config[
-        'LICMS_PASTES_PER_PAGE'], error_out=False)
+    pagination = queries.pastes().order_by(desc(Paste.timestamp)).paginate(page=page, per_page=current_app.config[
+        'LICMS_PASTES_PER_PAGE'], error_out=False, count=False)
+    pagination.total = totals.count(Paste.query, 'pastes')
     _pastes = pagination.items
     return render_template('moderate_pastes.html', title="All Pastes", pastes=_pastes, pagination=pagination,
                            endpoint='main.moderate_pastes', page=page)
@@ -373,6 +405,7 @@ def moderate_pastes():
 @main.route('/paste/moderate/enable/<int:paste_id>')
 @login_required
 @permission_required(Permission.MODERATE)
+@query_budget(7)
 def moderate_enable_paste(paste_id):
     _paste = db.get_or_404(Paste, paste_id)
     _paste.disabled = False
@@ -389,6 +422,7 @@ def moderate_enable_paste(paste_id):
 @main.route('/paste/moderate/disable/<int:paste_id>')
 @login_required
 @permission_required(Permission.MODERATE)
+@query_budget(5)
 def moderate_disable_paste(paste_id):
     _paste = db.get_or_404(Paste, paste_id)
     _paste.disabled = True
@@ -2,17 +2,24 @@ import base64
 import hashlib
 import os
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 
-import bleach
 import jwt
 import onetimepass
 from flask import current_app, url_for
 from flask_login import UserMixin, AnonymousUserMixin
-from markdown import markdown
+from sqlalchemy import or_
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import defer
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from app_core import db, login_manager
+from app_core import db, login_manager, renderer, totals, leaderboard, page_cache, presence, principals, \
+    credentials, reference
 from app_core.exceptions import ValidationError
+from app_core.rendering import RenderState, make_excerpt
+
+# Modification stamps back the API's ETags, so MySQL must keep their microseconds to tell two edits in a second apart
+Stamp = db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
 
 
 class Gender(db.Model):
@@ -105,10 +112,113 @@ class Role(db.Model):
 
 class Follow(db.Model):
     __tablename__ = 'follows'
+    __table_args__ = (
+        db.Index('ix_follows_followed_id_timestamp', 'followed_id', 'timestamp', 'follower_id'),
+        db.Index('ix_follows_follower_id_timestamp', 'follower_id', 'timestamp', 'followed_id')
+    )
     follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
 
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        adjust_counter(target, User.follower_count, target.followed_id, 1)
+        adjust_counter(target, User.followed_count, target.follower_id, 1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        adjust_counter(target, User.follower_count, target.followed_id, -1)
+        adjust_counter(target, User.followed_count, target.follower_id, -1)
+
+
+class TimelineEntry(db.Model):
+    __tablename__ = 'timelines'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    timestamp = db.Column(db.DateTime, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+
+    @staticmethod
+    def on_post_insert(mapper, connection, target):
+        if not current_app.config['LICMS_TIMELINE_ENABLED'] or target.author_id is None:
+            return
+        author = db.select(User.timeline_pull).where(User.id == target.author_id)
+        if connection.execute(author).scalar():
+            return
+        followers = connection.execute(db.select(db.func.count()).select_from(Follow).where(
+            Follow.followed_id == target.author_id)).scalar()
+        if followers > current_app.config['LICMS_TIMELINE_FANOUT_LIMIT']:
+            # From now on this author's posts are pulled into timelines at read time instead
+            connection.execute(db.update(User).where(User.id == target.author_id).values(timeline_pull=True))
+            connection.execute(db.update(User).where(User.id.in_(db.select(Follow.follower_id).where(
+                Follow.followed_id == target.author_id))).values(follows_pulled=True))
+            return
+        connection.execute(db.insert(TimelineEntry).from_select(
+            ['user_id', 'timestamp', 'post_id'],
+            db.select(Follow.follower_id, db.literal(target.timestamp), db.literal(target.id)).where(
+                Follow.followed_id == target.author_id)))
+
+    @staticmethod
+    def backfill(follower_id, followed_id):
+        if not current_app.config['LICMS_TIMELINE_ENABLED']:
+            return
+        if db.session.execute(db.select(User.timeline_pull).where(User.id == followed_id)).scalar():
+            db.session.execute(db.update(User).where(User.id == follower_id).values(follows_pulled=True))
+            db.session.commit()
+            return
+        batch_size = current_app.config['LICMS_TIMELINE_BATCH_SIZE']
+        posts = db.session.execute(db.select(Post.timestamp, Post.id).where(Post.author_id == followed_id).order_by(
+            Post.timestamp.desc()).limit(current_app.config['LICMS_TIMELINE_BACKFILL'])).all()
+        existing = set(db.session.execute(db.select(TimelineEntry.post_id).where(
+            TimelineEntry.user_id == follower_id, TimelineEntry.post_id.in_([p.id for p in posts]))).scalars())
+        rows = [{'user_id': follower_id, 'timestamp': p.timestamp, 'post_id': p.id} for p in posts
+                if p.id not in existing]
+        for i in range(0, len(rows), batch_size):
+            db.session.execute(db.insert(TimelineEntry), rows[i:i + batch_size])
+            db.session.commit()
+
+    @staticmethod
+    def prune(follower_id, followed_id):
+        if not current_app.config['LICMS_TIMELINE_ENABLED']:
+            return
+        TimelineEntry.update_follows_pulled(follower_id)
+        batch_size = current_app.config['LICMS_TIMELINE_BATCH_SIZE']
+        while True:
+            post_ids = db.session.execute(db.select(TimelineEntry.post_id).join(
+                Post, Post.id == TimelineEntry.post_id).where(
+                TimelineEntry.user_id == follower_id, Post.author_id == followed_id).limit(batch_size)).scalars().all()
+            if not post_ids:
+                return
+            db.session.execute(db.delete(TimelineEntry).where(
+                TimelineEntry.user_id == follower_id, TimelineEntry.post_id.in_(post_ids)))
+            db.session.commit()
+
+    @staticmethod
+    def update_follows_pulled(user_id):
+        pulled = db.select(Follow.followed_id).join(User, User.id == Follow.followed_id).where(
+            Follow.follower_id == user_id, User.timeline_pull.is_(True))
+        db.session.execute(db.update(User).where(User.id == user_id).values(follows_pulled=db.exists(pulled)))
+        db.session.commit()
+
+    @staticmethod
+    def rebuild():
+        db.session.execute(db.delete(TimelineEntry))
+        db.session.execute(db.update(User).values(timeline_pull=False, follows_pulled=False))
+        db.session.commit()
+        limit = current_app.config['LICMS_TIMELINE_FANOUT_LIMIT']
+        popular = db.select(Follow.followed_id).group_by(Follow.followed_id).having(db.func.count() > limit)
+        db.session.execute(db.update(User).where(User.id.in_(popular)).values(timeline_pull=True))
+        db.session.execute(db.update(User).where(User.id.in_(db.select(Follow.follower_id).where(
+            Follow.followed_id.in_(popular)))).values(follows_pulled=True))
+        db.session.commit()
+        for follow in db.session.execute(db.select(Follow.follower_id, Follow.followed_id)).all():
+            TimelineEntry.backfill(follow.follower_id, follow.followed_id)
+
+
+@lru_cache(maxsize=None)
+def password_method_prefix(method):
+    # werkzeug spells out the defaults in the hashes it makes, 'scrypt' is stored as 'scrypt:32768:8:1'
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -121,10 +231,20 @@ class User(UserMixin, db.Model):
     confirmed = db.Column(db.Boolean, default=False)
     location = db.Column(db.String(128))
     about_me = db.Column(db.Text)
-    member_since = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    member_since = db.Column(db.DateTime, index=True, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     last_seen = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
     gender_id = db.Column(db.Integer, db.ForeignKey('genders.id'))
+    timeline_pull = db.Column(db.Boolean, default=False)
+    # Whether this user follows a timeline_pull author, whose posts have to be merged into their timeline on read
+    follows_pulled = db.Column(db.Boolean, default=False)
+    post_count = db.Column(db.Integer, default=0, server_default='0', index=True)
+    comment_count = db.Column(db.Integer, default=0, server_default='0')
+    # Both include the follow every user has on themselves
+    follower_count = db.Column(db.Integer, default=0, server_default='0')
+    followed_count = db.Column(db.Integer, default=0, server_default='0')
+    # Part of every API token, bumping it revokes all tokens issued before
+    token_generation = db.Column(db.Integer, default=0, server_default='0')
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     comments = db.relationship('Comment', backref='author', lazy='dynamic')
     pastes = db.relationship('Paste', backref='author', lazy='dynamic')
@@ -144,11 +264,11 @@ class User(UserMixin, db.Model):
         if self.otp_secret is None:
             # generate a random secret
             self.generate_otp_secret()
-        if self.role is None:
+        if self.role is None and self.role_id is None:
             if self.email == current_app.config['LICMS_ADMIN'].lower():
-                self.role = Role.query.filter_by(name='Administrator').first()
+                self.role_id = reference.role_id('Administrator')
             else:
-                self.role = Role.query.filter_by(default=True).first()
+                self.role_id = reference.default_role_id()
         if self.email is not None and self.avatar_hash is None:
             self.avatar_hash = self.gravatar_hash()
         self.follow(self)
@@ -176,11 +296,22 @@ class User(UserMixin, db.Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=current_app.config['LICMS_PASSWORD_METHOD'])
+        credentials.forget(self.id)
 
     def verify_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def rehash_password(self, password):
+        # Upgrade a hash made with older KDF parameters, given the password it was just verified against
+        if self.password_hash.split('$', 1)[0] == password_method_prefix(current_app.config['LICMS_PASSWORD_METHOD']):
+            return False
+        self.password = password
+        db.session.add(self)
+        # Same password, new hash: bump_token_generation leaves the API tokens of the user alone for this one
+        db.object_session(self).info.setdefault('rehashed_passwords', {})[self.id] = self.password_hash
+        return True
+
     def generate_confirmation_token(self, expiration=600):
         payload = {'confirm': self.id, 'exp': datetime.now(timezone.utc) + timedelta(seconds=expiration)}
         return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm="HS256")
@@ -251,14 +382,16 @@ class User(UserMixin, db.Model):
         return True
 
     def can(self, permission):
-        return self.role is not None and self.role.has_permission(permission)
+        if self.role_id is None:
+            # A role assigned through the relationship only gets its id on flush
+            return self.role is not None and self.role.has_permission(permission)
+        return reference.permissions(self.role_id) & permission == permission
 
     def is_administrator(self):
         return self.can(Permission.ADMIN)
 
     def ping(self):
-        self.last_seen = datetime.now(timezone.utc)
-        db.session.add(self)
+        presence.ping(self)
 
     def gravatar_hash(self):
         return hashlib.md5(self.email.lower().encode('utf-8')).hexdigest()
@@ -274,12 +407,14 @@ class User(UserMixin, db.Model):
             f = Follow(follower=self, followed=user)
             db.session.add(f)
             db.session.commit()
+            TimelineEntry.backfill(self.id, user.id)
 
     def unfollow(self, user):
         f = self.followed.filter_by(followed_id=user.id).first()
         if f:
             db.session.delete(f)
             db.session.commit()
+            TimelineEntry.prune(self.id, user.id)
 
     def is_following(self, user):
         if user.id is None:
@@ -291,9 +426,31 @@ class User(UserMixin, db.Model):
             return False
         return self.followers.filter_by(follower_id=user.id).first() is not None
 
+    @property
+    def reads_timeline(self):
+        return current_app.config['LICMS_TIMELINE_ENABLED'] and not self.follows_pulled
+
+    @property
+    def followed_posts_order(self):
+        """The (timestamp, post id) columns to order and page followed_posts by."""
+        if self.reads_timeline:
+            # The order of the timelines primary key, so a page is a range scan joining posts only for its rows
+            return TimelineEntry.timestamp, TimelineEntry.post_id
+        return Post.timestamp, Post.id
+
     @property
     def followed_posts(self):
-        return Post.query.join(Follow, Follow.followed_id == Post.author_id).filter(Follow.follower_id == self.id)
+        if not current_app.config['LICMS_TIMELINE_ENABLED']:
+            return Post.query.join(Follow, Follow.followed_id == Post.author_id).filter(Follow.follower_id == self.id)
+        if self.reads_timeline:
+            return Post.query.join(TimelineEntry, TimelineEntry.post_id == Post.id).filter(
+                TimelineEntry.user_id == self.id)
+        pulled = db.session.execute(db.select(Follow.followed_id).join(User, User.id == Follow.followed_id).where(
+            Follow.follower_id == self.id, User.timeline_pull.is_(True))).scalars().all()
+        # Authors with too many followers aren't fanned out, their posts are merged in at read time
+        return Post.query.filter(or_(
+            Post.id.in_(db.select(TimelineEntry.post_id).where(TimelineEntry.user_id == self.id)),
+            Post.author_id.in_(pulled)))
 
     def to_json(self):
         return {
@@ -304,20 +461,38 @@ class User(UserMixin, db.Model):
             'gender': self.gender.name,
             'posts_url': url_for('api.get_user_posts', user_id=self.id),
             'followed_posts_url': url_for('api.get_user_followed_posts', user_id=self.id),
-            'post_count': self.posts.count()
+            'post_count': self.post_count
         }
 
     def generate_auth_token(self, expiration=600):
-        payload = {'user_id': self.id, 'exp': datetime.now(timezone.utc) + timedelta(seconds=expiration)}
+        # The claims let read-only API calls authorize without loading the user, see PrincipalCache
+        payload = {'user_id': self.id, 'exp': datetime.now(timezone.utc) + timedelta(seconds=expiration),
+                   'perm': reference.permissions(self.role_id), 'cfm': bool(self.confirmed),
+                   'gen': self.token_generation or 0}
         return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm="HS256")
 
     @staticmethod
-    def verify_auth_token(token, leeway=10):
+    def decode_auth_claims(token, leeway=10):
         try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], leeway=leeway, algorithms=["HS256"])
+            return jwt.decode(token, current_app.config['SECRET_KEY'], leeway=leeway, algorithms=["HS256"])
         except:
             return None
-        return db.session.get(User, data['user_id'])
+
+    @staticmethod
+    def decode_auth_token(token, leeway=10):
+        data = User.decode_auth_claims(token, leeway)
+        return data.get('user_id') if data is not None else None
+
+    def revoke_auth_tokens(self):
+        self.token_generation = (self.token_generation or 0) + 1
+        db.session.add(self)
+
+    @staticmethod
+    def verify_auth_token(token, leeway=10):
+        user_id = User.decode_auth_token(token, leeway)
+        if user_id is None:
+            return None
+        return db.session.get(User, user_id)
 
     def __repr__(self):
         return '<User %r>' % self.name
@@ -336,38 +511,115 @@ login_manager.anonymous_user = AnonymousUser
 
 @login_manager.user_loader
 def load_user(user_id):
+    # Nearly every page checks the current user's permissions
     return db.session.get(User, int(user_id))
 
 
 class Post(db.Model):
     __tablename__ = 'posts'
+    __table_args__ = (db.Index('ix_posts_author_id_timestamp', 'author_id', 'timestamp', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.Text)
     body = db.Column(db.Text)
     body_html = db.Column(db.Text)
+    excerpt = db.Column(db.String(512))
+    render_version = db.Column(db.String(16))
+    render_state = db.Column(db.String(16), default=RenderState.READY, server_default=RenderState.READY, index=True)
     timestamp = db.Column(db.DateTime, index=True, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    comment_count = db.Column(db.Integer, default=0, server_default='0')
+    updated_at = db.Column(Stamp, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None),
+                           onupdate=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     comments = db.relationship('Comment', backref='post', lazy='dynamic')
 
+    render_profile = 'post'
+
+    @property
+    def is_rendering(self):
+        return self.render_state == RenderState.PENDING
+
     @staticmethod
     def on_changed_body(target, value, old_value, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code', 'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
-                        'h1', 'h2', 'h3', 'p']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, extensions=current_app.config['LICMS_MARKDOWN_EXTENSIONS'], output_format='html'),
-            tags=allowed_tags, strip=True))
+        if renderer.should_defer(value, Post.render_profile):
+            # Large bodies are left for the render worker (flask render-worker), which polls for pending posts
+            target.body_html = None
+            target.excerpt = None
+            target.render_version = None
+            target.render_state = RenderState.PENDING
+            return
+        target.body_html = renderer.render(value, Post.render_profile)
+        target.excerpt = make_excerpt(target.body_html, current_app.config['LICMS_EXCERPT_LENGTH'])
+        target.render_version = renderer.version(Post.render_profile)
+        target.render_state = RenderState.READY
 
-    def to_json(self):
-        return {
+    @staticmethod
+    def without_body():
+        # Loader options for listings, which only ever show titles and excerpts
+        return defer(Post.body), defer(Post.body_html)
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        adjust_counter(target, User.post_count, target.author_id, 1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        adjust_counter(target, User.post_count, target.author_id, -1)
+
+    @staticmethod
+    def render_pending(post_id):
+        body = db.session.execute(db.select(Post.body).where(
+            Post.id == post_id, Post.render_state == RenderState.PENDING)).scalar()
+        if body is None:
+            return
+        body_html = renderer.render(body, Post.render_profile)
+        # Only write back if the body wasn't edited again while it was being rendered
+        db.session.execute(db.update(Post).where(Post.id == post_id, Post.body == body).values(
+            body_html=body_html,
+            excerpt=make_excerpt(body_html, current_app.config['LICMS_EXCERPT_LENGTH']),
+            render_version=renderer.version(Post.render_profile),
+            render_state=RenderState.READY))
+        db.session.commit()
+        page_cache.invalidate()
+
+    @staticmethod
+    def render_all_pending(batch_size=100):
+        """Render every pending post, oldest first, and return how many were rendered.
+
+        Pending rows are the queue, so posts left behind by a render worker that died are picked up by the next one.
+        """
+        rendered = 0
+        failed = set()
+        while True:
+            post_ids = db.session.scalars(db.select(Post.id).where(
+                Post.render_state == RenderState.PENDING, Post.id.not_in(sorted(failed))).order_by(Post.id).limit(
+                batch_size)).all()
+            if not post_ids:
+                return rendered
+            for post_id in post_ids:
+                try:
+                    Post.render_pending(post_id)
+                except Exception:
+                    db.session.rollback()
+                    failed.add(post_id)
+                    current_app.logger.exception('Render of post %d failed' % post_id)
+                else:
+                    rendered += 1
+
+    def to_json(self, include_body=True):
+        json_post = {
             'url': url_for('api.get_post', post_id=self.id),
             'title': self.title,
-            'body': self.body,
-            'body_html': self.body_html,
+            'excerpt': self.excerpt,
+            'render_state': self.render_state,
             'timestamp': self.timestamp,
             'author_url': url_for('api.get_user', user_id=self.author_id),
             'comments_url': url_for('api.get_post_comments', post_id=self.id),
-            'comment_count': self.comments.count()
+            'comment_count': self.comment_count
         }
+        if include_body:
+            json_post['body'] = self.body
+            json_post['body_html'] = self.body_html
+        return json_post
 
     @staticmethod
     def from_json(json_post):
@@ -381,24 +633,44 @@ class Post(db.Model):
 
 
 db.event.listen(Post.body, 'set', Post.on_changed_body)
+db.event.listen(Post, 'after_insert', Post.on_inserted)
+db.event.listen(Post, 'after_delete', Post.on_deleted)
+db.event.listen(Post, 'after_insert', TimelineEntry.on_post_insert)
 
 
 class Comment(db.Model):
     __tablename__ = "comments"
+    __table_args__ = (
+        db.Index('ix_comments_post_id_timestamp', 'post_id', 'timestamp', 'id'),
+        db.Index('ix_comments_disabled_timestamp', 'disabled', 'timestamp', 'id')
+    )
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text)
     body_html = db.Column(db.Text)
+    render_version = db.Column(db.String(16))
     timestamp = db.Column(db.DateTime, index=True, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     disabled = db.Column(db.Boolean)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'))
+    updated_at = db.Column(Stamp, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None),
+                           onupdate=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    render_profile = 'comment'
 
     @staticmethod
     def on_changed_body(target, value, old_value, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i', 'strong']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, extensions=current_app.config['LICMS_MARKDOWN_EXTENSIONS'], output_format='html'),
-            tags=allowed_tags, strip=True))
+        target.body_html = renderer.render(value, Comment.render_profile)
+        target.render_version = renderer.version(Comment.render_profile)
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        adjust_counter(target, User.comment_count, target.author_id, 1)
+        adjust_counter(target, Post.comment_count, target.post_id, 1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        adjust_counter(target, User.comment_count, target.author_id, -1)
+        adjust_counter(target, Post.comment_count, target.post_id, -1)
 
     def to_json(self):
         if self.disabled:
@@ -422,10 +694,18 @@ class Comment(db.Model):
 
 
 db.event.listen(Comment.body, 'set', Comment.on_changed_body)
+db.event.listen(Comment, 'after_insert', Comment.on_inserted)
+db.event.listen(Comment, 'after_delete', Comment.on_deleted)
+db.event.listen(Follow, 'after_insert', Follow.on_inserted)
+db.event.listen(Follow, 'after_delete', Follow.on_deleted)
 
 
 class Paste(db.Model):
     __tablename__ = "pastes"
+    __table_args__ = (
+        db.Index('ix_pastes_author_id_timestamp', 'author_id', 'timestamp', 'id'),
+        db.Index('ix_pastes_expiry', 'expiry')
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.Text)
     body = db.Column(db.Text)
@@ -487,3 +767,131 @@ class File(db.Model):
         if file_hash is None or file_hash == '' or len(file_hash) > 32:
             raise ValidationError('paste does not have a body')
         return File(name=name, file_hash=file_hash)
+
+
+def adjust_counter(target, column, row_id, delta):
+    # Summed per row over the whole flush and written by write_counters, so that a flush inserting many rows costs
+    # one UPDATE per counter and delta rather than one per row
+    if row_id is not None:
+        deltas = db.object_session(target).info.setdefault('counter_deltas', {})
+        deltas[column, row_id] = deltas.get((column, row_id), 0) + delta
+
+
+def write_counters(session, flush_context):
+    by_delta = {}
+    for (column, row_id), delta in session.info.pop('counter_deltas', {}).items():
+        if delta:
+            by_delta.setdefault((column, delta), []).append(row_id)
+    for (column, delta), row_ids in by_delta.items():
+        # Done in SQL so concurrent writers never lose an update
+        table = column.class_
+        session.connection().execute(db.update(table).where(table.id.in_(row_ids)).values(
+            {column.key: column + delta}))
+
+
+# Every counter with the query that recomputes it, used to repair drift in bulk
+COUNTERS = (
+    (User.post_count, lambda: db.select(db.func.count()).where(Post.author_id == User.id)),
+    (User.comment_count, lambda: db.select(db.func.count()).where(Comment.author_id == User.id)),
+    (User.follower_count, lambda: db.select(db.func.count()).where(Follow.followed_id == User.id)),
+    (User.followed_count, lambda: db.select(db.func.count()).where(Follow.follower_id == User.id)),
+    (Post.comment_count, lambda: db.select(db.func.count()).where(Comment.post_id == Post.id))
+)
+
+
+def reconcile_counters():
+    """Recompute every denormalized counter, returning how many rows were off for each."""
+    drift = {}
+    for column, actual in COUNTERS:
+        table = column.class_
+        value = actual().scalar_subquery()
+        result = db.session.execute(db.update(table).where(or_(column.is_(None), column != value)).values(
+            {column.key: value}).execution_options(synchronize_session=False))
+        drift['%s.%s' % (table.__tablename__, column.key)] = result.rowcount
+    db.session.commit()
+    return drift
+
+
+def note_changed_table(mapper, connection, target):
+    db.object_session(target).info.setdefault('changed_tables', set()).add(mapper.local_table.name)
+
+
+def note_changed_row(mapper, connection, target):
+    changed = {attr.key for attr in db.inspect(target).attrs if attr.history.has_changes()}
+    # Every authenticated request pings last_seen, which no cached page is worth dropping for
+    if changed - {'last_seen'}:
+        db.object_session(target).info['pages_changed'] = True
+
+
+PRINCIPAL_ATTRIBUTES = ('role', 'role_id', 'confirmed', 'password_hash')
+
+
+def bump_token_generation(mapper, connection, target):
+    # Tokens carry the role's permissions and the confirmed flag, so changing either retires them
+    state = db.inspect(target)
+    keys = PRINCIPAL_ATTRIBUTES
+    if target.password_hash == db.object_session(target).info.get('rehashed_passwords', {}).pop(target.id, None):
+        keys = tuple(key for key in keys if key != 'password_hash')
+    if any(state.attrs[key].history.has_changes() for key in keys) and \
+            not state.attrs.token_generation.history.has_changes():
+        target.token_generation = (target.token_generation or 0) + 1
+
+
+def note_changed_principal(mapper, connection, target):
+    state = db.inspect(target)
+    if any(state.attrs[key].history.has_changes() for key in PRINCIPAL_ATTRIBUTES + ('token_generation',)):
+        db.object_session(target).info.setdefault('changed_principals', set()).add(target.id)
+
+
+def note_deleted_principal(mapper, connection, target):
+    db.object_session(target).info.setdefault('changed_principals', set()).add(target.id)
+
+
+def note_changed_role(mapper, connection, target):
+    if db.inspect(target).attrs.permissions.history.has_changes():
+        connection.execute(db.update(User).where(User.role_id == target.id).values(
+            token_generation=db.func.coalesce(User.token_generation, 0) + 1))
+        db.object_session(target).info['roles_changed'] = True
+
+
+def note_changed_reference(mapper, connection, target):
+    db.object_session(target).info['reference_changed'] = True
+
+
+def invalidate_caches(session):
+    if session.info.pop('roles_changed', False):
+        principals.clear()
+    principals.invalidate(*session.info.pop('changed_principals', ()))
+    if session.info.pop('reference_changed', False):
+        reference.invalidate()
+    tables = session.info.pop('changed_tables', ())
+    totals.invalidate(*tables)
+    if 'posts' in tables:
+        leaderboard.invalidate()
+    if session.info.pop('pages_changed', False) or set(tables) & {'users', 'posts', 'comments', 'follows'}:
+        page_cache.invalidate()
+
+
+def discard_changed_tables(session):
+    for key in ('changed_tables', 'pages_changed', 'changed_principals', 'roles_changed', 'reference_changed',
+                'counter_deltas', 'rehashed_passwords'):
+        session.info.pop(key, None)
+
+
+# Only inserts and deletes change listing totals, and they are only dropped once the change is committed
+for _model in (User, Post, Comment, Follow, Paste):
+    db.event.listen(_model, 'after_insert', note_changed_table)
+    db.event.listen(_model, 'after_delete', note_changed_table)
+for _model in (User, Post, Comment):
+    db.event.listen(_model, 'after_update', note_changed_row)
+# API principals are snapshots of a user's role, confirmation and password, taken at token authentication
+db.event.listen(User, 'before_update', bump_token_generation)
+db.event.listen(User, 'after_update', note_changed_principal)
+db.event.listen(User, 'after_delete', note_deleted_principal)
+db.event.listen(Role, 'after_update', note_changed_role)
+for _model in (Role, Gender):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        db.event.listen(_model, _event, note_changed_reference)
+db.event.listen(db.session, 'after_flush', write_counters)
+db.event.listen(db.session, 'after_commit', invalidate_caches)
+db.event.listen(db.session, 'after_rollback', discard_changed_tables)
@@ -0,0 +1,53 @@
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from app_core.cache import LRUCache
+
+
+class PageCache:
+    """Whole rendered pages for anonymous visitors, keyed by path and query string.
+
+    Anything that can make a page personal bypasses it: a login session or remember-me cookie, pending flashed
+    messages and the show_followed cookie. Committed writes to the models a cached page shows clear the cache in this
+    process and LICMS_PAGE_CACHE_TTL bounds how long other workers keep serving their copy.
+    """
+
+    def __init__(self, app=None):
+        self.cache = LRUCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache.maxsize = app.config['LICMS_PAGE_CACHE_SIZE']
+        self.cache.ttl = app.config['LICMS_PAGE_CACHE_TTL']
+        self.cache.clear()
+
+    @staticmethod
+    def bypassed():
+        return request.method != 'GET' \
+            or '_user_id' in session \
+            or '_flashes' in session \
+            or request.cookies.get('show_followed') \
+            or request.cookies.get(current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token'))
+
+    def __call__(self, func):
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            if self.cache.maxsize <= 0 or self.bypassed():
+                return func(*args, **kwargs)
+            key = request.full_path
+            cached = self.cache.get(key)
+            if cached is not None:
+                body, mimetype = cached
+                return current_app.response_class(body, mimetype=mimetype)
+            response = make_response(func(*args, **kwargs))
+            # A page that touched the session, e.g. for a CSRF token, must not hand its cookie to everyone else
+            if response.status_code == 200 and not session.modified and 'Set-Cookie' not in response.headers:
+                self.cache.set(key, (response.get_data(), response.mimetype))
+            return response
+
+        return decorated_function
+
+    def invalidate(self):
+        self.cache.delete_matching(lambda key: True)
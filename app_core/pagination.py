@@ -0,0 +1,129 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import request, current_app, abort
+from sqlalchemy import and_, or_
+
+from app_core import totals
+
+
+class KeysetPagination:
+    """Page through `query` ordered by `columns`, e.g. (Post.timestamp, Post.id), without OFFSET.
+
+    A page is addressed by an opaque cursor holding the key of the row it starts after (or before, when walking
+    backwards), so every page is an index range scan no matter how deep it is. The last column has to make the key
+    unique. A plain page number is still understood for old links, but every link handed out carries a cursor.
+    paginate() only honours page numbers up to LICMS_MAX_PAGE_NUMBER, deeper ones are a 400 (API) or a 404.
+    Passing `totals_key`, the (name, parent[, counter]) arguments of Totals.count, serves .total from there, and
+    `keys` names the attributes of an item holding the key when they aren't named like the columns.
+    """
+
+    def __init__(self, query, columns, per_page, cursor=None, page=None, descending=True, totals_key=None,
+                 keys=None):
+        self.query = query
+        self.columns = columns
+        self.keys = keys or [column.key for column in columns]
+        self.per_page = per_page
+        self.descending = descending
+        self.totals_key = totals_key
+        self._total = None
+        direction, key = self.decode_cursor(cursor)
+        if key is not None:
+            self._fetch_after(key, backwards=direction == 'p')
+        else:
+            self._fetch_page(max(page or 1, 1))
+
+    @staticmethod
+    def encode_cursor(direction, key):
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+        token = json.dumps([direction, values], separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, None
+        try:
+            token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(token)
+            if direction not in ('n', 'p') or len(values) != len(self.columns):
+                raise ValueError(cursor)
+            key = [datetime.fromisoformat(value) if column.type.python_type is datetime else
+                   column.type.python_type(value) for column, value in zip(self.columns, values)]
+        except (binascii.Error, ValueError, TypeError, NotImplementedError):
+            # A mangled cursor is not worth an error page, start from the top instead
+            return None, None
+        return direction, key
+
+    def _order(self, backwards):
+        descending = self.descending != backwards
+        return [column.desc() if descending else column.asc() for column in self.columns]
+
+    def _after(self, key, backwards):
+        # (a, b) < (x, y) spelled out as a < x OR (a = x AND b < y), which every backend can use an index for
+        descending = self.descending != backwards
+        clauses = []
+        for i, column in enumerate(self.columns):
+            equal = [c == v for c, v in zip(self.columns[:i], key[:i])]
+            clauses.append(and_(*equal, column < key[i] if descending else column > key[i]))
+        return or_(*clauses)
+
+    def _fetch_after(self, key, backwards):
+        rows = self.query.filter(self._after(key, backwards)).order_by(*self._order(backwards)).limit(
+            self.per_page + 1).all()
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            self.items = rows[::-1]
+            self.has_prev, self.has_next = more, True
+        else:
+            self.items = rows
+            self.has_prev, self.has_next = True, more
+
+    def _fetch_page(self, page):
+        rows = self.query.order_by(*self._order(False)).offset((page - 1) * self.per_page).limit(
+            self.per_page + 1).all()
+        self.items = rows[:self.per_page]
+        self.has_prev = page > 1
+        self.has_next = len(rows) > self.per_page
+
+    def _key(self, item):
+        return [getattr(item, key) for key in self.keys]
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.items:
+            return None
+        return self.encode_cursor('n', self._key(self.items[-1]))
+
+    @property
+    def prev_cursor(self):
+        if not self.has_prev or not self.items:
+            return None
+        return self.encode_cursor('p', self._key(self.items[0]))
+
+    @property
+    def total(self):
+        # Only paid for by callers that actually show a total
+        if self._total is None:
+            if self.totals_key is None:
+                self._total = self.query.order_by(None).count()
+            else:
+                self._total = totals.count(self.query, *self.totals_key)
+        return self._total
+
+
+def paginate(query, columns, per_page, descending=True, totals_key=None, keys=None):
+    page = request.args.get('page', type=int)
+    limit = current_app.config['LICMS_MAX_PAGE_NUMBER']
+    if page is not None and page > limit and not request.args.get('cursor'):
+        # The OFFSET of a deep page number reads every row above it, so it is refused rather than served
+        if request.blueprint == 'api':
+            from app_core.api.errors import bad_request
+
+            abort(bad_request('page numbers past %d are not served, follow the next and prev cursor links '
+                              'instead' % limit))
+        abort(404)
+    return KeysetPagination(query, columns, per_page, cursor=request.args.get('cursor'), page=page,
+                            descending=descending, totals_key=totals_key, keys=keys)
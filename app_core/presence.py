@@ -0,0 +1,85 @@
+import atexit
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.attributes import set_committed_value
+
+
+class Presence:
+    """Write-behind buffer for User.last_seen.
+
+    Every authenticated request pings its user, and writing that through the session dirties the users row in
+    whatever transaction commits next, so hot users end up contending for their own row. Pings are instead coalesced
+    per worker: a user is recorded at most once per LICMS_LAST_SEEN_RESOLUTION seconds, and the buffered values are
+    written as one bulk UPDATE on a connection of their own once LICMS_LAST_SEEN_FLUSH_INTERVAL seconds have passed,
+    and when the process exits. A flush interval of 0 keeps the old behaviour of writing through the session.
+    """
+
+    def __init__(self, app=None):
+        # engine -> {user id: last seen}, so that several apps in one process never write into each other's database
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self._exit_hook = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.teardown_request(self.flush_due)
+        if not self._exit_hook:
+            atexit.register(self.flush_at_exit)
+            self._exit_hook = True
+
+    def ping(self, user):
+        from app_core import db
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if not current_app.config['LICMS_LAST_SEEN_FLUSH_INTERVAL']:
+            user.last_seen = now
+            db.session.add(user)
+            return
+        with self.lock:
+            seen = self.pending.setdefault(db.engine, {})
+            last = seen.get(user.id) or user.last_seen
+            resolution = timedelta(seconds=current_app.config['LICMS_LAST_SEEN_RESOLUTION'])
+            if last is not None and now - last.replace(tzinfo=None) < resolution:
+                return
+            seen[user.id] = now
+        # Visible to the rest of this request without marking the row dirty
+        set_committed_value(user, 'last_seen', now)
+
+    def flush(self):
+        from app_core.models import User
+
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+        users = User.__table__
+        statement = users.update().where(users.c.id == bindparam('user_id')).values(last_seen=bindparam('seen'))
+        written = 0
+        for engine, seen in pending.items():
+            if seen:
+                with engine.begin() as connection:
+                    connection.execute(statement, [{'user_id': user_id, 'seen': last_seen}
+                                                   for user_id, last_seen in seen.items()])
+                written += len(seen)
+        return written
+
+    def flush_due(self, exc=None):
+        interval = current_app.config['LICMS_LAST_SEEN_FLUSH_INTERVAL']
+        if interval and self.pending and time.monotonic() - self.flushed_at >= interval:
+            try:
+                self.flush()
+            except SQLAlchemyError:
+                # Losing a few last_seen values is better than failing the request that happened to flush them
+                current_app.logger.exception('Flushing last_seen updates failed')
+
+    def flush_at_exit(self):
+        try:
+            self.flush()
+        except SQLAlchemyError:
+            pass
@@ -0,0 +1,102 @@
+from app_core.cache import LRUCache
+
+
+class Principal:
+    """What API authorization needs to know about a user, detached from the session.
+
+    It answers the same questions as User for the checks the API makes (confirmed, can, is_administrator), and views
+    that need more than that refer to the user by id.
+    """
+
+    is_anonymous = False
+
+    def __init__(self, user_id, confirmed, permissions):
+        self.id = user_id
+        self.confirmed = confirmed
+        self.permissions = permissions
+
+    @classmethod
+    def of(cls, user):
+        from app_core import reference
+
+        return cls(user.id, bool(user.confirmed), reference.permissions(user.role_id))
+
+    def can(self, permission):
+        return self.permissions & permission == permission
+
+    def is_administrator(self):
+        from app_core.models import Permission
+
+        return self.can(Permission.ADMIN)
+
+
+class PrincipalCache:
+    """Principals of recently seen API tokens.
+
+    Tokens carry the user's permission bits, confirmed flag and token generation as claims. Read-only calls are
+    authorized from those claims alone once the generation is known to be current, and the current generation of
+    each user is cached, so they need no identity query at all. Other calls use a snapshot loaded from the user,
+    keyed by (user id, token) so that everything cached for a user can be dropped at once. Committing a change to a
+    user's role, confirmation, password or token generation does so in this process, and LICMS_PRINCIPAL_CACHE_TTL
+    bounds how long other workers keep serving the old state. The token itself is still decoded on every request,
+    so an expired token is refused whether or not it is cached.
+    """
+
+    def __init__(self, app=None):
+        self.cache = LRUCache()
+        self.generations = LRUCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for cache in (self.cache, self.generations):
+            cache.maxsize = app.config['LICMS_PRINCIPAL_CACHE_SIZE']
+            cache.ttl = app.config['LICMS_PRINCIPAL_CACHE_TTL']
+            cache.clear()
+
+    def generation(self, user_id, refresh=False):
+        from app_core import db
+        from app_core.models import User
+
+        generation = None if refresh else self.generations.get(user_id)
+        if generation is None:
+            generation = db.session.execute(db.select(User.token_generation).where(User.id == user_id)).scalar()
+            if generation is not None:
+                self.generations.set(user_id, generation)
+        return generation
+
+    def verify_token(self, token, read_only=False):
+        from app_core import db
+        from app_core.models import User
+
+        claims = User.decode_auth_claims(token)
+        if claims is None or claims.get('user_id') is None:
+            return None
+        user_id = claims['user_id']
+        if read_only and {'perm', 'cfm', 'gen'} <= claims.keys():
+            # A token newer than the cached generation means the cache is what is out of date
+            generation = self.generation(user_id)
+            if generation is not None and claims['gen'] > generation:
+                generation = self.generation(user_id, refresh=True)
+            if claims['gen'] != generation:
+                return None
+            return Principal(user_id, claims['cfm'], claims['perm'])
+        key = (user_id, token)
+        principal = self.cache.get(key)
+        if principal is None:
+            user = db.session.get(User, user_id)
+            if user is None or claims.get('gen', 0) != (user.token_generation or 0):
+                return None
+            principal = Principal.of(user)
+            self.cache.set(key, principal)
+        return principal
+
+    def invalidate(self, *user_ids):
+        if user_ids:
+            self.cache.delete_matching(lambda key: key[0] in user_ids)
+            for user_id in user_ids:
+                self.generations.delete(user_id)
+
+    def clear(self):
+        self.cache.delete_matching(lambda key: True)
+        self.generations.delete_matching(lambda key: True)
@@ -0,0 +1,42 @@
+"""Loader strategies for listing queries.
+
+Every listing renders the author or gender of each row, so these helpers load them up front and a page costs
+the same number of queries however many rows it holds. Each one takes the query to decorate, or starts a new one.
+"""
+from sqlalchemy.orm import joinedload
+
+from app_core.models import User, Post, Comment, Paste, Follow
+
+
+def users(query=None):
+    return (query if query is not None else User.query).options(joinedload(User.gender))
+
+
+def posts(query=None, authors=True):
+    query = (query if query is not None else Post.query).options(*Post.without_body())
+    if authors:
+        query = query.options(joinedload(Post.author))
+    return query
+
+
+def post(post_id):
+    return Post.query.options(joinedload(Post.author)).filter_by(id=post_id)
+
+
+def comments(query=None, authors=True):
+    query = query if query is not None else Comment.query
+    if authors:
+        query = query.options(joinedload(Comment.author))
+    return query
+
+
+def pastes(query=None):
+    return (query if query is not None else Paste.query).options(joinedload(Paste.author))
+
+
+def followers(query):
+    return query.options(joinedload(Follow.follower).joinedload(User.gender))
+
+
+def followed(query):
+    return query.options(joinedload(Follow.followed).joinedload(User.gender))
@@ -0,0 +1,140 @@
+import hashlib
+import hmac
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, request, session
+from werkzeug.exceptions import TooManyRequests
+
+
+def client_ip():
+    return request.remote_addr
+
+
+def form_email():
+    email = request.form.get('email')
+    return email.strip().lower() if email else None
+
+
+def session_email():
+    return session.get('email')
+
+
+def basic_auth_email():
+    # The email a Basic auth password was sent for; calls made with a token are not rate limited
+    auth = request.authorization
+    if auth is None or not auth.username or not auth.password:
+        return None
+    return auth.username.lower()
+
+
+class RateLimiter:
+    """Sliding-window request counters shared by every worker process on the host.
+
+    Counters live in a small SQLite file (LICMS_RATE_LIMIT_STORE) so gunicorn workers see each other's hits without
+    any external service. Each key keeps a counter for the current and the previous fixed window, and a hit is let
+    through while the previous window's count, weighted by how much of it still overlaps the sliding window, plus
+    the current count stays under the limit. Refused hits are not counted, so a client that backs off for the
+    Retry-After it was given gets in again. An empty store disables limiting.
+
+    Keys can be emails or API tokens, so only an HMAC of each is stored, in a file only this user can read. Rows of
+    windows that have slid out are swept at most once per SWEEP_INTERVAL seconds, whether their key came back or not.
+    """
+
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, app=None):
+        self.store = None
+        self.secret = b''
+        self.next_sweep = 0
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.store = app.config['LICMS_RATE_LIMIT_STORE']
+        if self.store is None:
+            self.store = os.path.join(app.instance_path, 'licms-rate-limits.sqlite')
+        self.secret = app.config['SECRET_KEY'].encode('utf-8')
+        # Connections are per thread, and a new app (or a new store) must not reuse the previous one's
+        self._local = threading.local()
+
+    def create_store(self):
+        # SQLite gives the -wal and -shm files the permissions of the database, so creating it private is enough
+        directory = os.path.dirname(os.path.abspath(self.store))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.close(os.open(self.store, os.O_RDWR | os.O_CREAT, 0o600))
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.store != ':memory:':
+                self.create_store()
+            connection = sqlite3.connect(self.store, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Counters may lose the last moments before a power cut, in exchange no hit waits for an fsync
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS rate_limit_windows (key TEXT NOT NULL, '
+                               'slot INTEGER NOT NULL, hits INTEGER NOT NULL, expires REAL NOT NULL, '
+                               'PRIMARY KEY (key, slot)) WITHOUT ROWID')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_windows_expires '
+                               'ON rate_limit_windows (expires)')
+            self._local.connection = connection
+        return connection
+
+    def digest(self, key):
+        return hmac.new(self.secret, key.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def hit(self, key, limit, period, now=None):
+        """Count a hit on `key` if it is allowed and return None, or else return the seconds until it would be."""
+        now = time.time() if now is None else now
+        slot, elapsed = divmod(now, period)
+        slot = int(slot)
+        connection = self.connection()
+        # IMMEDIATE takes the write lock up front, so the read and the increment are atomic across processes
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            counts = dict(connection.execute('SELECT slot, hits FROM rate_limit_windows WHERE key = ? AND slot >= ?',
+                                             (key, slot - 1)).fetchall())
+            previous, current = counts.get(slot - 1, 0), counts.get(slot, 0)
+            weight = 1 - elapsed / period
+            if previous * weight + current >= limit:
+                connection.execute('COMMIT')
+                return self.retry_after(previous, current, limit, period, elapsed)
+            # A window counts until the one after it has fully slid past
+            connection.execute('INSERT INTO rate_limit_windows (key, slot, hits, expires) VALUES (?, ?, 1, ?) '
+                               'ON CONFLICT (key, slot) DO UPDATE SET hits = hits + 1',
+                               (key, slot, (slot + 2) * period))
+            if now >= self.next_sweep:
+                self.next_sweep = now + self.SWEEP_INTERVAL
+                connection.execute('DELETE FROM rate_limit_windows WHERE expires <= ?', (now,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return None
+
+    @staticmethod
+    def retry_after(previous, current, limit, period, elapsed):
+        if current >= limit:
+            # Wait for the next window, then for enough of this one to slide out of it
+            return period - elapsed + max(0.0, 1 - limit / current) * period
+        # Within this window, once enough of the previous one has slid out
+        return (1 - (limit - current) / previous) * period - elapsed
+
+    def check(self, scope, limit, period, keys):
+        """Count this request against `scope` for every key function, raising TooManyRequests if any is over."""
+        if not self.store:
+            return
+        limit, period = current_app.config['LICMS_RATE_LIMITS'].get(scope, (limit, period))
+        for key in keys:
+            value = key()
+            if value is None:
+                continue
+            wait = self.hit(self.digest('%s:%s:%s' % (scope, key.__name__, value)), limit, period)
+            if wait is not None:
+                # Whole seconds, rounded so that a client waiting exactly that long is let through
+                raise TooManyRequests(retry_after=math.floor(wait) + 1)
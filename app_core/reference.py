@@ -0,0 +1,59 @@
+from app_core.cache import LRUCache
+
+
+class ReferenceSet:
+    def __init__(self, roles, genders):
+        self.permissions = {role.id: role.permissions or 0 for role in roles}
+        self.role_ids = {role.name: role.id for role in roles}
+        self.default_role_id = next((role.id for role in roles if role.default), None)
+        self.role_choices = sorted(((role.id, role.name) for role in roles), key=lambda choice: choice[1])
+        self.gender_choices = [(gender.id, gender.name) for gender in genders]
+
+
+class ReferenceData:
+    """Roles and genders, which only change when an admin edits them or a deploy runs insert_roles/insert_genders.
+
+    Both tables are read once per worker and database into a ReferenceSet, so permission checks, the default role of
+    a new user and the form choices cost no queries. Committing any change to either table reloads it in this
+    process, and LICMS_REFERENCE_TTL bounds how long other workers keep the old set.
+    """
+
+    def __init__(self, app=None):
+        self.cache = LRUCache(maxsize=8)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache.ttl = app.config['LICMS_REFERENCE_TTL']
+        self.cache.clear()
+
+    def get(self):
+        from app_core import db
+        from app_core.models import Role, Gender
+
+        # Keyed by engine so that apps bound to different databases never share a set
+        data = self.cache.get(db.engine)
+        if data is None:
+            roles = db.session.execute(db.select(Role.id, Role.name, Role.permissions, Role.default)).all()
+            genders = db.session.execute(db.select(Gender.id, Gender.name).order_by(Gender.id)).all()
+            data = ReferenceSet(roles, genders)
+            self.cache.set(db.engine, data)
+        return data
+
+    def permissions(self, role_id):
+        return self.get().permissions.get(role_id, 0)
+
+    def role_id(self, name):
+        return self.get().role_ids.get(name)
+
+    def default_role_id(self):
+        return self.get().default_role_id
+
+    def role_choices(self):
+        return list(self.get().role_choices)
+
+    def gender_choices(self):
+        return list(self.get().gender_choices)
+
+    def invalidate(self):
+        self.cache.delete_matching(lambda key: True)
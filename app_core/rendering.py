@@ -0,0 +1,303 @@
+import hashlib
+import multiprocessing
+import re
+import threading
+from collections import deque
+from html import unescape
+
+import bleach
+from flask import current_app
+from markdown import Markdown
+from markdown.extensions import codehilite, fenced_code
+from markdown.extensions.attr_list import get_attrs_and_remainder, AttrListExtension
+from markdown.serializers import _escape_attrib_html
+from sqlalchemy import select, update, or_
+
+from app_core.cache import LRUCache
+
+# Bump whenever a change to the rendering code itself should invalidate every stored body_html
+RENDERER_REVISION = 1
+
+
+class RenderState:
+    READY = 'ready'
+    PENDING = 'pending'
+
+
+class RenderProfile:
+    def __init__(self, name, allowed_tags):
+        self.name = name
+        self.allowed_tags = allowed_tags
+
+
+PROFILES = {
+    'post': RenderProfile('post', ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code', 'em', 'i', 'li', 'ol', 'pre',
+                                   'strong', 'ul', 'h1', 'h2', 'h3', 'p']),
+    'comment': RenderProfile('comment', ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i', 'strong'])
+}
+
+highlight_cache = LRUCache()
+
+
+class CachedCodeHilite(codehilite.CodeHilite):
+    def hilite(self, shebang=True):
+        if highlight_cache.maxsize <= 0:
+            return super(CachedCodeHilite, self).hilite(shebang)
+        options = repr(sorted((k, v) for k, v in self.options.items() if k != 'style'))
+        key = (self.lang, hashlib.sha256(self.src.encode('utf-8')).hexdigest(), self.options.get('style'), shebang,
+               self.guess_lang, self.use_pygments, options)
+        html = highlight_cache.get(key)
+        if html is None:
+            html = super(CachedCodeHilite, self).hilite(shebang)
+            highlight_cache.set(key, html)
+        return html
+
+
+class CachedHiliteTreeprocessor(codehilite.HiliteTreeprocessor):
+    # HiliteTreeprocessor.run with CachedCodeHilite in place of CodeHilite
+    def run(self, root):
+        for block in root.iter('pre'):
+            if len(block) == 1 and block[0].tag == 'code':
+                local_config = self.config.copy()
+                text = block[0].text
+                if text is None:
+                    continue
+                code = CachedCodeHilite(self.code_unescape(text), tab_length=self.md.tab_length,
+                                        style=local_config.pop('pygments_style', 'default'), **local_config)
+                placeholder = self.md.htmlStash.store(code.hilite())
+                block.clear()
+                block.tag = 'p'
+                block.text = placeholder
+
+
+class CachedFencedBlockPreprocessor(fenced_code.FencedBlockPreprocessor):
+    # FencedBlockPreprocessor.run with CachedCodeHilite in place of CodeHilite
+    def run(self, lines):
+        if not self.checked_for_deps:
+            for ext in self.md.registeredExtensions:
+                if isinstance(ext, codehilite.CodeHiliteExtension):
+                    self.codehilite_conf = ext.getConfigs()
+                if isinstance(ext, AttrListExtension):
+                    self.use_attr_list = True
+            self.checked_for_deps = True
+
+        text = '\n'.join(lines)
+        index = 0
+        while True:
+            m = self.FENCED_BLOCK_RE.search(text, index)
+            if not m:
+                break
+            lang, id, classes, config = None, '', [], {}
+            if m.group('attrs'):
+                attrs, remainder = get_attrs_and_remainder(m.group('attrs'))
+                if remainder:
+                    index = m.end('attrs')
+                    continue
+                id, classes, config = self.handle_attrs(attrs)
+                if len(classes):
+                    lang = classes.pop(0)
+            else:
+                if m.group('lang'):
+                    lang = m.group('lang')
+                if m.group('hl_lines'):
+                    config['hl_lines'] = codehilite.parse_hl_lines(m.group('hl_lines'))
+
+            if self.codehilite_conf and self.codehilite_conf['use_pygments'] and config.get('use_pygments', True):
+                local_config = self.codehilite_conf.copy()
+                local_config.update(config)
+                if classes:
+                    local_config['css_class'] = '{} {}'.format(' '.join(classes), local_config['css_class'])
+                code = CachedCodeHilite(m.group('code'), lang=lang, style=local_config.pop('pygments_style', 'default'),
+                                        **local_config).hilite(shebang=False)
+            else:
+                id_attr = lang_attr = class_attr = kv_pairs = ''
+                if lang:
+                    prefix = self.config.get('lang_prefix', 'language-')
+                    lang_attr = ' class="%s%s"' % (prefix, _escape_attrib_html(lang))
+                if classes:
+                    class_attr = ' class="%s"' % _escape_attrib_html(' '.join(classes))
+                if id:
+                    id_attr = ' id="%s"' % _escape_attrib_html(id)
+                if self.use_attr_list and config and not config.get('use_pygments', False):
+                    kv_pairs = ''.join(' %s="%s"' % (k, _escape_attrib_html(v)) for k, v in config.items()
+                                       if k != 'use_pygments')
+                code = '<pre%s%s><code%s%s>%s</code></pre>' % (id_attr, class_attr, lang_attr, kv_pairs,
+                                                               self._escape(m.group('code')))
+
+            placeholder = self.md.htmlStash.store(code)
+            text = '%s\n%s\n%s' % (text[:m.start()], placeholder, text[m.end():])
+            index = m.start() + 1 + len(placeholder)
+        return text.split('\n')
+
+
+class CachedCodeHiliteExtension(codehilite.CodeHiliteExtension):
+    def extendMarkdown(self, md):
+        hiliter = CachedHiliteTreeprocessor(md)
+        hiliter.config = self.getConfigs()
+        md.treeprocessors.register(hiliter, 'hilite', 30)
+        md.registerExtension(self)
+
+
+class CachedFencedCodeExtension(fenced_code.FencedCodeExtension):
+    def extendMarkdown(self, md):
+        md.registerExtension(self)
+        md.preprocessors.register(CachedFencedBlockPreprocessor(md, self.getConfigs()), 'fenced_code_block', 25)
+
+
+def engine_extensions(extensions):
+    """The configured extensions, with code highlighting going through the highlight cache.
+
+    Only the render engines load these, plain markdown() calls elsewhere keep the library's own processors.
+    """
+    loaded = [CachedCodeHiliteExtension() if name == 'codehilite' else name for name in extensions
+              if name != 'fenced_code']
+    if 'fenced_code' in extensions or 'extra' in extensions:
+        # Last, so it replaces the fenced_code_block preprocessor extra registers as well
+        loaded.append(CachedFencedCodeExtension())
+    return loaded
+
+# Markdown instances and bleach's Cleaner/Linker are all stateful and not thread-safe, so every thread keeps its own
+# pre-built set per (profile, extensions) and reuses it for every body it renders.
+_engines = threading.local()
+
+
+def get_engine(profile, extensions):
+    engines = getattr(_engines, 'engines', None)
+    if engines is None:
+        engines = _engines.engines = {}
+    key = (profile.name, tuple(extensions))
+    engine = engines.get(key)
+    if engine is None:
+        engine = engines[key] = (Markdown(extensions=engine_extensions(extensions), output_format='html'),
+                                 bleach.Cleaner(tags=profile.allowed_tags, strip=True),
+                                 bleach.Linker())
+    return engine
+
+
+def render_markdown(body, extensions, profile):
+    md, cleaner, linker = get_engine(profile, extensions)
+    md.reset()
+    return linker.linkify(cleaner.clean(md.convert(body)))
+
+
+def make_excerpt(body_html, length):
+    if body_html is None:
+        return None
+    # Block boundaries become spaces, inline markup simply disappears
+    text = re.sub(r'<br\s*/?>|</(?:p|h[1-6]|li|pre|blockquote|dd|dt|td|th)>', ' ', body_html)
+    text = ' '.join(unescape(re.sub(r'<[^>]+>', '', text)).split())
+    if len(text) <= length:
+        return text
+    cut = text.rfind(' ', 0, length)
+    return text[:cut if cut > 0 else length].rstrip() + '\u2026'
+
+
+def render_rows(rows, extensions, profile_name):
+    profile = PROFILES[profile_name]
+    return [(row_id, render_markdown(body or '', extensions, profile)) for row_id, body in rows]
+
+
+class Renderer:
+    def __init__(self, app=None):
+        self.cache = LRUCache()
+        self.highlight_cache = highlight_cache
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache.maxsize = app.config['LICMS_RENDER_CACHE_SIZE']
+        self.highlight_cache.maxsize = app.config['LICMS_HIGHLIGHT_CACHE_SIZE']
+
+    @staticmethod
+    def cache_key(body, extensions, profile):
+        # Key on a digest rather than the body itself so that large posts don't pin extra copies in memory
+        return hashlib.sha256(body.encode('utf-8')).hexdigest(), tuple(extensions), frozenset(profile.allowed_tags)
+
+    @staticmethod
+    def version(profile_name):
+        extensions = current_app.config['LICMS_MARKDOWN_EXTENSIONS']
+        fingerprint = repr((RENDERER_REVISION, tuple(extensions), sorted(PROFILES[profile_name].allowed_tags)))
+        return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:16]
+
+    def is_cached(self, body, profile_name):
+        extensions = current_app.config['LICMS_MARKDOWN_EXTENSIONS']
+        return self.cache_key(body, extensions, PROFILES[profile_name]) in self.cache
+
+    def should_defer(self, body, profile_name):
+        threshold = current_app.config['LICMS_ASYNC_RENDER_THRESHOLD']
+        return bool(threshold) and body is not None and len(body) > threshold and \
+            not self.is_cached(body, profile_name)
+
+    def render(self, body, profile_name):
+        if body is None:
+            return None
+        profile = PROFILES[profile_name]
+        extensions = current_app.config['LICMS_MARKDOWN_EXTENSIONS']
+        key = self.cache_key(body, extensions, profile)
+        html = self.cache.get(key)
+        if html is None:
+            html = render_markdown(body, extensions, profile)
+            self.cache.set(key, html)
+        return html
+
+
+def rerender_stale(session, model, chunk_size=500, processes=None):
+    """Re-render every row of `model` whose render_version is out of date, returning the number of rows written.
+
+    Rows are walked in primary key order and each chunk is committed on its own, so an interrupted run picks up
+    where it stopped: rows already written carry the current version and are no longer selected.
+    """
+    extensions = current_app.config['LICMS_MARKDOWN_EXTENSIONS']
+    profile_name = model.render_profile
+    version = Renderer.version(profile_name)
+    processes = processes or multiprocessing.cpu_count()
+    stale = or_(model.render_version.is_(None), model.render_version != version)
+    excerpt_length = None
+    if hasattr(model, 'excerpt'):
+        # Rows written before excerpts existed are refreshed as well
+        stale = or_(stale, model.excerpt.is_(None))
+        excerpt_length = current_app.config['LICMS_EXCERPT_LENGTH']
+
+    last_id = 0
+
+    def next_chunk():
+        nonlocal last_id
+        rows = session.execute(select(model.id, model.body).where(stale, model.id > last_id).order_by(
+            model.id).limit(chunk_size)).all()
+        if rows:
+            last_id = rows[-1][0]
+        return [tuple(row) for row in rows]
+
+    values = {'render_version': version}
+    if hasattr(model, 'render_state'):
+        values['render_state'] = RenderState.READY
+
+    def write(results):
+        rows = [dict(values, id=row_id, body_html=body_html) for row_id, body_html in results]
+        if excerpt_length is not None:
+            for row in rows:
+                row['excerpt'] = make_excerpt(row['body_html'], excerpt_length)
+        session.execute(update(model), rows)
+        session.commit()
+        return len(results)
+
+    written = 0
+    if processes == 1:
+        while rows := next_chunk():
+            written += write(render_rows(rows, extensions, profile_name))
+        return written
+
+    with multiprocessing.Pool(processes) as pool:
+        pending = deque()
+        exhausted = False
+        while not exhausted or pending:
+            if not exhausted:
+                rows = next_chunk()
+                if rows:
+                    pending.append(pool.apply_async(render_rows, (rows, extensions, profile_name)))
+                else:
+                    exhausted = True
+            # Keep every worker busy while the main process writes finished chunks back in order
+            if pending and (exhausted or len(pending) >= 2 * processes):
+                written += write(pending.popleft().get())
+    return written
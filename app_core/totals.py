@@ -0,0 +1,53 @@
+from flask import request, has_request_context
+
+from app_core.cache import LRUCache
+
+# Which cached totals a write to each table makes stale
+DEPENDENCIES = {
+    'posts': ('posts', 'timeline'),
+    'comments': ('comments',),
+    'pastes': ('pastes',),
+    'follows': ('timeline',),
+    'users': ('users',)
+}
+
+
+class Totals:
+    """Row counts for paginated listings, served from a short-lived cache instead of a COUNT(*) per page view.
+
+    Totals are keyed by (name, parent), e.g. ('comments', post_id), or ('comments', None) for the whole table.
+    Committed inserts and deletes drop the affected totals in this process, the TTL bounds how stale the other
+    workers can get, and ?exact=1 always counts and refreshes the cached value. Callers holding a maintained counter
+    for the total, such as Post.comment_count, pass it along and skip both the cache and the COUNT.
+    """
+
+    def __init__(self, app=None):
+        self.cache = LRUCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache.maxsize = app.config['LICMS_TOTALS_CACHE_SIZE']
+        self.cache.ttl = app.config['LICMS_TOTALS_TTL']
+        # A new app may well be talking to another database
+        self.cache.clear()
+
+    @staticmethod
+    def exact_requested():
+        return has_request_context() and request.args.get('exact', 0, type=int) == 1
+
+    def count(self, query, name, parent=None, counter=None):
+        exact = self.exact_requested()
+        if counter is not None and not exact:
+            return counter
+        key = (name, parent)
+        total = None if exact else self.cache.get(key)
+        if total is None:
+            total = query.order_by(None).count()
+            self.cache.set(key, total)
+        return total
+
+    def invalidate(self, *tables):
+        names = {name for table in tables for name in DEPENDENCIES.get(table, (table,))}
+        if names:
+            self.cache.delete_matching(lambda key: key[0] in names)
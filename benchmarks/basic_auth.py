@@ -0,0 +1,61 @@
+"""Compare requests/sec of HTTP Basic API authentication with and without the credential cache.
+
+Usage: python benchmarks/basic_auth.py [--seconds 3]
+"""
+import argparse
+import os
+import sys
+import time
+from base64 import b64encode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_core import create_app, db, credentials, limiter  # noqa: E402
+from app_core.models import Role, Gender, User, Post  # noqa: E402
+
+
+def requests_per_second(client, url, headers, seconds):
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        assert client.get(url, headers=headers).status_code == 200
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0, help='Time spent on each measurement.')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    app.config['LICMS_QUERY_BUDGET_MODE'] = None
+    # Every request of the KDF run is a password attempt, which the API would soon throttle
+    app.config['LICMS_RATE_LIMIT_STORE'] = ''
+    limiter.init_app(app)
+    with app.app_context():
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        user = User(email='bench@example.com', name='bench', password='cat', confirmed=True,
+                    gender_id=Gender.query.first().id)
+        db.session.add_all([user, Post(title='title', body='body', author=user)])
+        db.session.commit()
+        url = '/api/v1/posts/%d' % Post.query.first().id
+        headers = {'Authorization': 'Basic ' + b64encode(b'bench@example.com:cat').decode('utf-8'),
+                   'Accept': 'application/json'}
+        client = app.test_client()
+
+        print('%-24s %10s' % ('method', 'req/s'))
+        results = []
+        for label, size in (('KDF on every request', 0), ('credential cache', 4096)):
+            credentials.cache.maxsize = size
+            credentials.cache.clear()
+            results.append(requests_per_second(client, url, headers, args.seconds))
+            print('%-24s %10.1f' % (label, results[-1]))
+        print('%-24s %9.2fx' % ('speedup', results[1] / results[0]))
+
+
+if __name__ == '__main__':
+    main()
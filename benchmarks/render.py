@@ -0,0 +1,75 @@
+"""Compare renders/sec of the legacy per-call Markdown pipeline against the pooled render engine.
+
+Usage: python benchmarks/render.py [--seconds 2]
+"""
+import argparse
+import os
+import sys
+import time
+
+import bleach
+from markdown import markdown
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_core.rendering import PROFILES, render_markdown  # noqa: E402
+from config import Config  # noqa: E402
+
+SECTION = '''## Section {n}
+
+Some *emphasised* and **strong** prose with a link to https://example.com/{n} and `inline code`.
+
+- first item
+- second item with [a link](https://example.org/{n})
+
+```python
+def handler_{n}(request):
+    return {{'status': 'ok', 'id': {n}}}
+```
+
+'''
+
+
+def make_body(size):
+    body = ''
+    n = 0
+    while len(body) < size:
+        body += SECTION.format(n=n)
+        n += 1
+    return body[:size]
+
+
+def legacy_render(body, extensions, profile):
+    return bleach.linkify(bleach.clean(markdown(body, extensions=extensions, output_format='html'),
+                                       tags=profile.allowed_tags, strip=True))
+
+
+def renders_per_second(render, body, extensions, profile, seconds):
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        render(body, extensions, profile)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=2.0, help='Time spent on each measurement.')
+    args = parser.parse_args()
+
+    extensions = Config.LICMS_MARKDOWN_EXTENSIONS
+    print('%-8s %-8s %14s %14s %8s' % ('profile', 'body', 'legacy r/s', 'engine r/s', 'speedup'))
+    for profile in PROFILES.values():
+        for label, size in (('small', 300), ('medium', 5 * 1024), ('100KB', 100 * 1024)):
+            body = make_body(size)
+            # The two paths must agree before their speed is worth comparing
+            assert legacy_render(body, extensions, profile) == render_markdown(body, extensions, profile)
+            legacy = renders_per_second(legacy_render, body, extensions, profile, args.seconds)
+            engine = renders_per_second(render_markdown, body, extensions, profile, args.seconds)
+            print('%-8s %-8s %14.1f %14.1f %7.2fx' % (profile.name, label, legacy, engine, engine / legacy))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,10 +10,59 @@ class Config:
     LICMS_USERS_PER_PAGE = int(os.environ.get('LICMS_USERS_PER_PAGE', 50))
     LICMS_COMMENTS_PER_PAGE = int(os.environ.get('LICMS_COMMENTS_PER_PAGE', 30))
     LICMS_PASTES_PER_PAGE = int(os.environ.get('LICMS_PASTES_PER_PAGE', 40))
+    # Deepest ?page= number cursor-paginated listings still serve with an OFFSET, deeper ones are refused
+    LICMS_MAX_PAGE_NUMBER = int(os.environ.get('LICMS_MAX_PAGE_NUMBER', 10))
     LICMS_SLOW_DB_QUERY_TIME = float(os.environ.get('LICMS_SLOW_DB_QUERY_TIME', 0.5))
     LICMS_MARKDOWN_EXTENSIONS = ['abbr', 'admonition', 'attr_list', 'codehilite', 'def_list', 'extra', 'fenced_code',
                                  'footnotes', 'legacy_attrs', 'legacy_em', 'md_in_html', 'meta', 'nl2br', 'sane_lists',
                                  'smarty', 'tables', 'toc', 'wikilinks']
+    LICMS_RENDER_CACHE_SIZE = int(os.environ.get('LICMS_RENDER_CACHE_SIZE', 2048))
+    # Length in characters of the plain text excerpt stored with every post, must stay below 512
+    LICMS_EXCERPT_LENGTH = int(os.environ.get('LICMS_EXCERPT_LENGTH', 200))
+    LICMS_HIGHLIGHT_CACHE_SIZE = int(os.environ.get('LICMS_HIGHLIGHT_CACHE_SIZE', 8192))
+    # Post bodies longer than this many characters are left to `flask render-worker`, 0 renders everything in-request
+    LICMS_ASYNC_RENDER_THRESHOLD = int(os.environ.get('LICMS_ASYNC_RENDER_THRESHOLD', 0))
+    # Seconds the render worker sleeps when no post is pending
+    LICMS_RENDER_POLL_INTERVAL = float(os.environ.get('LICMS_RENDER_POLL_INTERVAL', 2))
+    # Seconds a cached listing total may lag behind writes made by other worker processes
+    LICMS_TOTALS_TTL = int(os.environ.get('LICMS_TOTALS_TTL', 60))
+    LICMS_TOTALS_CACHE_SIZE = int(os.environ.get('LICMS_TOTALS_CACHE_SIZE', 4096))
+    LICMS_LEADERBOARD_TTL = int(os.environ.get('LICMS_LEADERBOARD_TTL', 300))
+    # Anonymous page cache, 0 pages disables it
+    LICMS_PAGE_CACHE_SIZE = int(os.environ.get('LICMS_PAGE_CACHE_SIZE', 512))
+    LICMS_PAGE_CACHE_TTL = int(os.environ.get('LICMS_PAGE_CACHE_TTL', 60))
+    # Seconds other workers may keep using roles and genders changed elsewhere
+    LICMS_REFERENCE_TTL = int(os.environ.get('LICMS_REFERENCE_TTL', 300))
+    # Full werkzeug method string, hashes made with anything else are upgraded on the next successful login
+    LICMS_PASSWORD_METHOD = os.environ.get('LICMS_PASSWORD_METHOD', 'scrypt:32768:8:1')
+    # Seconds a verified Basic auth password is accepted again without running the KDF, 0 entries disables it
+    LICMS_CREDENTIAL_CACHE_TTL = int(os.environ.get('LICMS_CREDENTIAL_CACHE_TTL', 300))
+    LICMS_CREDENTIAL_CACHE_SIZE = int(os.environ.get('LICMS_CREDENTIAL_CACHE_SIZE', 4096))
+    # Seconds an API token keeps authenticating with the role and confirmation its user had when it was last looked up
+    LICMS_PRINCIPAL_CACHE_TTL = int(os.environ.get('LICMS_PRINCIPAL_CACHE_TTL', 30))
+    LICMS_PRINCIPAL_CACHE_SIZE = int(os.environ.get('LICMS_PRINCIPAL_CACHE_SIZE', 4096))
+    # 'log' or 'raise' when a request runs more SQL statements than its endpoint's budget, anything else ignores it
+    LICMS_QUERY_BUDGET_MODE = os.environ.get('LICMS_QUERY_BUDGET_MODE')
+    # Endpoint name to statement budget, overriding the @query_budget declared on the view
+    LICMS_QUERY_BUDGETS = {}
+    # Most items accepted by one request to a batch create endpoint
+    LICMS_API_BATCH_LIMIT = int(os.environ.get('LICMS_API_BATCH_LIMIT', 500))
+    # Rows fetched per query by the NDJSON export endpoints
+    LICMS_EXPORT_CHUNK_SIZE = int(os.environ.get('LICMS_EXPORT_CHUNK_SIZE', 1000))
+    LICMS_TIMELINE_ENABLED = os.environ.get('LICMS_TIMELINE_ENABLED', 'false').lower() in ['true', 'on', '1']
+    # Authors with more followers than this are merged into timelines at read time instead of fanned out on write
+    LICMS_TIMELINE_FANOUT_LIMIT = int(os.environ.get('LICMS_TIMELINE_FANOUT_LIMIT', 1000))
+    LICMS_TIMELINE_BACKFILL = int(os.environ.get('LICMS_TIMELINE_BACKFILL', 200))
+    LICMS_TIMELINE_BATCH_SIZE = int(os.environ.get('LICMS_TIMELINE_BATCH_SIZE', 500))
+    # last_seen is stored at most once per this many seconds per user
+    LICMS_LAST_SEEN_RESOLUTION = int(os.environ.get('LICMS_LAST_SEEN_RESOLUTION', 60))
+    # Seconds buffered last_seen updates wait before they are written in bulk, 0 writes them with the request
+    LICMS_LAST_SEEN_FLUSH_INTERVAL = int(os.environ.get('LICMS_LAST_SEEN_FLUSH_INTERVAL', 10))
+    # SQLite file holding the rate limit counters every worker on this host shares, empty disables rate limiting.
+    # Unset, it is licms-rate-limits.sqlite in the app's instance folder
+    LICMS_RATE_LIMIT_STORE = os.environ.get('LICMS_RATE_LIMIT_STORE')
+    # Scope name to (hits, seconds), overriding the limit declared with @rate_limit
+    LICMS_RATE_LIMITS = {}
     LICMS_FAKER_LANG_LIST = ['en_US', 'fr_FR', 'zh_CN']
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -35,6 +84,7 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    LICMS_QUERY_BUDGET_MODE = os.environ.get('LICMS_QUERY_BUDGET_MODE', 'log')
     credentials = {
         'username': os.environ.get('DEV_DB_USERNAME'),
         'password': os.environ.get('DEV_DB_PASSWORD'),
@@ -57,6 +107,10 @@ class TestingConfig(Config):
         'TEST_DB_URL'
     ) or 'sqlite://'
     WTF_CSRF_ENABLED = False
+    LICMS_QUERY_BUDGET_MODE = 'raise'
+    LICMS_LAST_SEEN_RESOLUTION = 0
+    LICMS_LAST_SEEN_FLUSH_INTERVAL = 0
+    LICMS_RATE_LIMIT_STORE = ':memory:'
 
 
 class ProductionConfig(Config):
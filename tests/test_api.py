@@ -131,6 +131,21 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(json_response.get('count', 0), 1)
         self.assertEqual(json_response['posts'][0], json_post)
 
+        # listings send full posts, unless asked to leave the body out
+        response = self.client.get('/api/v1/posts/', headers=self.get_api_headers('john@example.com', 'cat'))
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.get_data(as_text=True))
+        self.assertEqual(json_response['posts'][0], json_post)
+        self.assertTrue(json_response['include_body'])
+        for listing in ('/api/v1/posts/', '/api/v1/users/{}/posts/'.format(u.id),
+                        '/api/v1/users/{}/timeline/'.format(u.id)):
+            response = self.client.get(listing + '?body=false', headers=self.get_api_headers('john@example.com', 'cat'))
+            json_response = json.loads(response.get_data(as_text=True))
+            self.assertFalse(json_response['include_body'])
+            self.assertEqual(json_response['posts'][0]['excerpt'], 'body of the blog post')
+            self.assertNotIn('body', json_response['posts'][0])
+            self.assertNotIn('body_html', json_response['posts'][0])
+
         # get the post from the user as a follower
         response = self.client.get('/api/v1/users/{}/timeline/'.format(u.id),
                                    headers=self.get_api_headers('john@example.com', 'cat'))
@@ -0,0 +1,71 @@
+import unittest
+from base64 import b64encode
+
+from app_core import create_app, db
+from app_core.models import Role, Gender, User, Post, Comment
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['LICMS_API_BATCH_LIMIT'] = 3
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.user = User(email='john@example.com', name='john', password='cat', confirmed=True,
+                         gender_id=Gender.query.first().id)
+        db.session.add(self.user)
+        db.session.commit()
+        self.user_id = self.user.id
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def post(self, url, items):
+        return self.client.post(url, json=items, headers={
+            'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8')})
+
+    def test_posts(self):
+        response = self.post('/api/v1/posts/batch', [{'title': 'a', 'body': 'a'}, {'title': 'b', 'body': '*b*'}])
+        self.assertEqual(response.status_code, 201)
+        results = response.get_json()['results']
+        self.assertEqual([result['status'] for result in results], [201, 201])
+        post = db.session.scalar(db.select(Post).where(Post.title == 'b'))
+        self.assertTrue(results[1]['location'].endswith('/api/v1/posts/%d' % post.id))
+        self.assertEqual(post.body_html, '<p><em>b</em></p>')
+        # Both counted in the one flush
+        self.assertEqual(db.session.get(User, self.user_id).post_count, 2)
+
+    def test_atomic(self):
+        response = self.post('/api/v1/posts/batch', [{'title': 'a', 'body': 'a'}, {'title': 'b'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.get_json()['results']], [424, 400])
+        self.assertEqual(db.session.scalar(db.select(db.func.count()).select_from(Post)), 0)
+        self.assertEqual(db.session.get(User, self.user_id).post_count, 0)
+
+    def test_best_effort(self):
+        post = Post(title='t', body='b', author=self.user)
+        db.session.add(post)
+        db.session.commit()
+        post_id = post.id
+        response = self.post('/api/v1/posts/%d/comments/batch?mode=best-effort' % post_id,
+                             [{'body': 'a'}, {'body': ''}, 'b'])
+        self.assertEqual(response.status_code, 207)
+        results = response.get_json()['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 400])
+        self.assertIn('location', results[0])
+        self.assertEqual(db.session.scalars(db.select(Comment.body)).all(), ['a'])
+        self.assertEqual(db.session.get(Post, post_id).comment_count, 1)
+
+    def test_rejected_batches(self):
+        self.assertEqual(self.post('/api/v1/posts/batch', {'title': 'a', 'body': 'a'}).status_code, 400)
+        self.assertEqual(self.post('/api/v1/posts/batch', []).status_code, 400)
+        self.assertEqual(self.post('/api/v1/posts/batch', [{'title': 'a', 'body': 'a'}] * 4).status_code, 400)
+        self.assertEqual(self.post('/api/v1/posts/batch?mode=maybe', [{'title': 'a', 'body': 'a'}]).status_code,
+                         400)
+        self.assertEqual(self.post('/api/v1/posts/99/comments/batch', [{'body': 'a'}]).status_code, 404)
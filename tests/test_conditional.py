@@ -0,0 +1,91 @@
+import unittest
+from base64 import b64encode
+
+from app_core import create_app, db
+from app_core.models import Role, Gender, User, Post, Comment
+
+
+class ConditionalGetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        user = User(email='john@example.com', name='john', password='cat', confirmed=True,
+                    gender_id=Gender.query.first().id)
+        post = Post(title='title', body='body', author=user)
+        comment = Comment(body='comment', author=user, post=post)
+        db.session.add_all([user, post, comment])
+        db.session.commit()
+        self.user_id, self.post_id, self.comment_id = user.id, post.id, comment.id
+        self.client = self.app.test_client()
+        self.statements = []
+        db.event.listen(db.engine, 'before_cursor_execute', self.count)
+
+    def tearDown(self):
+        db.event.remove(db.engine, 'before_cursor_execute', self.count)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def get(self, url, **headers):
+        headers['Authorization'] = 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8')
+        db.session.remove()
+        self.statements = []
+        return self.client.get(url, headers=headers)
+
+    def test_post(self):
+        url = '/api/v1/posts/%d' % self.post_id
+        response = self.get(url)
+        etag = response.headers['ETag']
+        self.assertIsNotNone(response.last_modified)
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.get(url, **{'If-Modified-Since': response.headers['Last-Modified']}).status_code,
+                         304)
+        post = db.session.get(Post, self.post_id)
+        post.title = 'new title'
+        db.session.commit()
+        response = self.get(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.get_json()['title'], 'new title')
+
+    def test_not_modified_is_answered_from_the_stamp(self):
+        url = '/api/v1/posts/%d' % self.post_id
+        etag = self.get(url).headers['ETag']
+        response = self.get(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+        self.assertFalse([statement for statement in self.statements if 'posts.body' in statement])
+
+    def test_new_comment_changes_post(self):
+        url = '/api/v1/posts/%d' % self.post_id
+        etag = self.get(url).headers['ETag']
+        db.session.add(Comment(body='another', author_id=self.user_id, post_id=self.post_id))
+        db.session.commit()
+        response = self.get(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['comment_count'], 2)
+
+    def test_comment_and_user(self):
+        for url in ('/api/v1/comments/%d' % self.comment_id, '/api/v1/users/%d' % self.user_id):
+            etag = self.get(url).headers['ETag']
+            self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 304)
+        user = db.session.get(User, self.user_id)
+        user.name = 'johnny'
+        db.session.commit()
+        self.assertEqual(self.get(url, **{'If-None-Match': etag}).status_code, 200)
+        self.assertEqual(self.get('/api/v1/comments/99', **{'If-None-Match': etag}).status_code, 404)
+
+    def test_collection(self):
+        response = self.get('/api/v1/posts/')
+        etag = response.headers['ETag']
+        self.assertEqual(self.get('/api/v1/posts/', **{'If-None-Match': etag}).status_code, 304)
+        db.session.add(Post(title='second', body='body', author_id=self.user_id))
+        db.session.commit()
+        self.assertEqual(self.get('/api/v1/posts/', **{'If-None-Match': etag}).status_code, 200)
@@ -0,0 +1,69 @@
+import unittest
+
+from app_core import create_app, db
+from app_core.models import Role, Gender, User, Post, Comment, reconcile_counters
+
+
+class CountersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.u1 = User(email='john@example.com', password='cat')
+        self.u2 = User(email='susan@example.com', password='dog')
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_post_and_comment_counters(self):
+        p = Post(title='title', body='body', author=self.u1)
+        db.session.add_all([Comment(body='comment', author=self.u2, post=p) for _ in range(2)])
+        db.session.commit()
+        self.assertEqual(self.u1.post_count, 1)
+        self.assertEqual(self.u1.comment_count, 0)
+        self.assertEqual(self.u2.comment_count, 2)
+        self.assertEqual(p.comment_count, 2)
+        db.session.delete(p.comments.first())
+        db.session.commit()
+        self.assertEqual(self.u2.comment_count, 1)
+        self.assertEqual(p.comment_count, 1)
+        with self.app.test_request_context('/'):
+            self.assertEqual(p.to_json()['comment_count'], 1)
+
+    def test_follow_counters(self):
+        # the self-follow every user starts with
+        self.assertEqual(self.u1.follower_count, 1)
+        self.assertEqual(self.u1.followed_count, 1)
+        self.u1.follow(self.u2)
+        self.assertEqual(self.u1.followed_count, 2)
+        self.assertEqual(self.u2.follower_count, 2)
+        self.u1.unfollow(self.u2)
+        self.assertEqual(self.u1.followed_count, 1)
+        self.assertEqual(self.u2.follower_count, 1)
+
+    def test_reconcile(self):
+        db.session.add(Post(title='title', body='body', author=self.u1))
+        db.session.commit()
+        db.session.execute(db.update(User).values(post_count=5, follower_count=None))
+        db.session.commit()
+        drift = reconcile_counters()
+        self.assertEqual(drift['users.post_count'], 2)
+        self.assertEqual(drift['users.follower_count'], 2)
+        self.assertEqual(drift['posts.comment_count'], 0)
+        self.assertEqual(self.u1.post_count, 1)
+        self.assertEqual(self.u2.post_count, 0)
+        self.assertEqual(self.u2.follower_count, 1)
+
+    def test_user_listing_reads_counters(self):
+        db.session.add(Post(title='title', body='body', author=self.u1))
+        db.session.commit()
+        response = self.app.test_client().get('/user')
+        self.assertIn('Posts: 1', response.get_data(as_text=True))
+        self.assertIn('Followers: 0', response.get_data(as_text=True))
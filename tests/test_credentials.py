@@ -0,0 +1,79 @@
+import unittest
+from base64 import b64encode
+from unittest import mock
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app_core import create_app, db, credentials
+from app_core.models import Role, Gender, User
+
+
+class CredentialCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.user = User(email='john@example.com', name='john', password='cat', confirmed=True,
+                         gender_id=Gender.query.first().id)
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_verified_password_skips_kdf(self):
+        with mock.patch('app_core.models.check_password_hash', wraps=check_password_hash) as kdf:
+            self.assertTrue(credentials.verify(self.user, 'cat'))
+            self.assertTrue(credentials.verify(self.user, 'cat'))
+            self.assertEqual(kdf.call_count, 1)
+            self.assertFalse(credentials.verify(self.user, 'dog'))
+            self.assertFalse(credentials.verify(self.user, 'dog'))
+            self.assertEqual(kdf.call_count, 3)
+        self.assertNotIn(b'cat', credentials.cache.get(self.user.id))
+
+    def test_password_change(self):
+        self.assertTrue(credentials.verify(self.user, 'cat'))
+        self.user.password = 'dog'
+        db.session.commit()
+        self.assertFalse(credentials.verify(self.user, 'cat'))
+        self.assertTrue(credentials.verify(self.user, 'dog'))
+
+    def test_stale_digest_does_not_match_new_hash(self):
+        # A password changed by another worker leaves this cache untouched, but the stored hash no longer matches
+        self.assertTrue(credentials.verify(self.user, 'cat'))
+        db.session.execute(db.update(User).values(password_hash=generate_password_hash('dog')))
+        db.session.commit()
+        self.assertFalse(credentials.verify(self.user, 'cat'))
+
+    def test_rehash_outdated_hash(self):
+        self.user.password_hash = generate_password_hash('cat', method='pbkdf2:sha256:1000')
+        db.session.commit()
+        headers = {'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8'),
+                   'Accept': 'application/json'}
+        self.assertEqual(self.app.test_client().get('/api/v1/posts/', headers=headers).status_code, 200)
+        user = db.session.get(User, self.user.id)
+        self.assertTrue(user.password_hash.startswith(self.app.config['LICMS_PASSWORD_METHOD'] + '$'))
+        self.assertTrue(user.verify_password('cat'))
+        self.assertFalse(user.rehash_password('cat'))
+
+    def test_short_method_names_rehash_once(self):
+        for method in ('scrypt', 'pbkdf2:sha256'):
+            self.app.config['LICMS_PASSWORD_METHOD'] = method
+            user = db.session.get(User, self.user.id)
+            user.password = 'cat'
+            db.session.commit()
+            # Stored with the parameters werkzeug fills in, which still match the configured method
+            self.assertNotEqual(user.password_hash.split('$', 1)[0], method)
+            self.assertFalse(user.rehash_password('cat'))
+
+    def test_rehash_on_login(self):
+        self.user.password_hash = generate_password_hash('cat', method='pbkdf2:sha256:1000')
+        db.session.commit()
+        response = self.app.test_client().post('/auth/login', data={'email': 'john@example.com', 'password': 'cat'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(db.session.get(User, self.user.id).password_hash.startswith('scrypt:'))
@@ -0,0 +1,66 @@
+import json
+import unittest
+from base64 import b64encode
+from datetime import datetime
+
+from app_core import create_app, db
+from app_core.models import Role, Gender, User, Post, Comment
+
+
+class ExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['LICMS_EXPORT_CHUNK_SIZE'] = 3
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.user = User(email='john@example.com', name='john', password='cat', confirmed=True,
+                         gender_id=Gender.query.first().id)
+        db.session.add(self.user)
+        db.session.commit()
+        self.posts = [Post(title='post %d' % i, body='body %d' % i, author=self.user,
+                           timestamp=datetime(2024, 1, i + 1)) for i in range(8)]
+        db.session.add_all(self.posts)
+        db.session.add_all([Comment(body='shown', author=self.user, post=self.posts[0]),
+                            Comment(body='hidden', author=self.user, post=self.posts[0], disabled=True)])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def export(self, url, status=200):
+        response = self.client.get(url, headers={
+            'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8')})
+        self.assertEqual(response.status_code, status)
+        if status != 200:
+            return response
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_posts(self):
+        rows = self.export('/api/v1/export/posts.ndjson')
+        self.assertEqual([row['title'] for row in rows], ['post %d' % i for i in range(8)])
+        self.assertEqual(set(rows[0]), {'id', 'title', 'excerpt', 'timestamp', 'author_id', 'comment_count'})
+
+    def test_filters_and_fields(self):
+        rows = self.export('/api/v1/export/posts.ndjson?since=2024-01-03&until=2024-01-06T00:00:00%2B00:00'
+                           '&fields=title,body')
+        self.assertEqual(rows, [{'title': 'post %d' % i, 'body': 'body %d' % i} for i in range(2, 5)])
+        self.export('/api/v1/export/posts.ndjson?fields=title,secret', 400)
+        self.export('/api/v1/export/posts.ndjson?since=yesterday', 400)
+        self.export('/api/v1/export/pastes.ndjson', 404)
+
+    def test_comments_skip_disabled(self):
+        rows = self.export('/api/v1/export/comments.ndjson')
+        self.assertEqual([row['body'] for row in rows], ['shown'])
+
+    def test_users_never_expose_credentials(self):
+        rows = self.export('/api/v1/export/users.ndjson')
+        self.assertEqual(rows[0]['name'], 'john')
+        for field in ('email', 'password_hash', 'otp_secret'):
+            self.export('/api/v1/export/users.ndjson?fields=id,%s' % field, 400)
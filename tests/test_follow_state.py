@@ -0,0 +1,95 @@
+import unittest
+
+from flask import g
+from sqlalchemy import event
+
+from app_core import create_app, db
+from app_core.follow_state import FollowState
+from app_core.models import Role, Gender, User
+
+
+class FollowStateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.client = self.app.test_client()
+        self.statements = 0
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_statement(self, *args):
+        self.statements += 1
+
+    def add_users(self, n):
+        gender = Gender.query.first()
+        users = [User(email='user%d@example.com' % i, name='user %d' % i, password='cat', confirmed=True,
+                      gender_id=gender.id) for i in range(User.query.count(), User.query.count() + n)]
+        db.session.add_all(users)
+        db.session.commit()
+        return users
+
+    def login(self, u):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(u.id)
+            session['_fresh'] = True
+
+    def test_both_directions_in_one_query(self):
+        me, a, b, c = self.add_users(4)
+        me.follow(a)
+        b.follow(me)
+        me.follow(c)
+        c.follow(me)
+        state = FollowState(me.id)
+        # the commits in follow() expired the users, reload them before counting
+        for u in (a, b, c):
+            db.session.refresh(u)
+        self.statements = 0
+        state.load([a, b, c])
+        self.assertEqual(self.statements, 1)
+        self.assertEqual([state.is_following(u) for u in (a, b, c)], [True, False, True])
+        self.assertEqual([state.is_followed_by(u) for u in (a, b, c)], [False, True, True])
+        self.assertEqual(self.statements, 1)
+
+    def test_unloaded_user_is_looked_up(self):
+        me, a = self.add_users(2)
+        a.follow(me)
+        state = FollowState(me.id)
+        self.assertTrue(state.is_followed_by(a))
+        self.assertFalse(state.is_following(a))
+        self.assertFalse(FollowState(None).is_following(a))
+
+    def test_followers_page_uses_constant_queries(self):
+        me = self.add_users(1)[0]
+        me.follow(me)
+        for u in self.add_users(2):
+            u.follow(me)
+        self.login(me)
+
+        def queries():
+            # the test keeps one app context, so drop the user Flask-Login cached from the last request
+            g.pop('_login_user', None)
+            db.session.remove()
+            self.statements = 0
+            response = self.client.get('/followers/%d' % me.id)
+            self.assertEqual(response.status_code, 200)
+            return self.statements, response.get_data(as_text=True)
+
+        before, _ = queries()
+        me = db.session.get(User, me.id)
+        followers = self.add_users(6)
+        for u in followers:
+            u.follow(me)
+        me.follow(followers[0])
+        after, html = queries()
+        self.assertEqual(after, before)
+        self.assertEqual(html.count('>Unfollow<'), 1)
+        self.assertEqual(html.count('>Follow<'), 7)
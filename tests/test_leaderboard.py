@@ -0,0 +1,51 @@
+import unittest
+
+from app_core import create_app, db, leaderboard
+from app_core.models import Role, Gender, User, Post
+
+
+class LeaderboardTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.users = [User(email='user%d@example.com' % i, name='user %d' % i, password='cat') for i in range(4)]
+        db.session.add_all(self.users)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_posts(self, user, n):
+        db.session.add_all([Post(title='title', body='body', author=user) for _ in range(n)])
+        db.session.commit()
+
+    def test_ranking(self):
+        self.add_posts(self.users[2], 3)
+        self.add_posts(self.users[0], 1)
+        self.add_posts(self.users[3], 1)
+        self.assertEqual(leaderboard.top(8), [self.users[2], self.users[0], self.users[3]])
+        self.assertEqual(leaderboard.top(1), [self.users[2]])
+
+    def test_post_changes_refresh_ranking(self):
+        self.add_posts(self.users[0], 1)
+        self.assertEqual(leaderboard.top(8), [self.users[0]])
+        self.assertEqual(leaderboard.top(8), [self.users[0]])
+        self.assertEqual(leaderboard.cache.hits, 1)
+        self.add_posts(self.users[1], 2)
+        self.assertEqual(leaderboard.top(8), [self.users[1], self.users[0]])
+        db.session.delete(self.users[1].posts.first())
+        db.session.delete(self.users[1].posts.all()[-1])
+        db.session.commit()
+        self.assertEqual(leaderboard.top(8), [self.users[0]])
+
+    def test_index_shows_leaderboard(self):
+        self.add_posts(self.users[1], 1)
+        response = self.app.test_client().get('/')
+        self.assertIn('@user 1', response.get_data(as_text=True))
+        self.assertNotIn('@user 2', response.get_data(as_text=True))
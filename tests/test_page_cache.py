@@ -0,0 +1,75 @@
+import unittest
+
+from app_core import create_app, db, page_cache
+from app_core.models import Role, Gender, User, Post
+
+
+class PageCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.user = User(email='john@example.com', name='john', password='cat', confirmed=True)
+        self.post = Post(title='first title', body='body', author=self.user)
+        db.session.add(self.post)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_anonymous_pages_are_cached(self):
+        url = '/post/{}'.format(self.post.id)
+        first = self.client.get(url).get_data(as_text=True)
+        self.assertEqual(self.client.get(url).get_data(as_text=True), first)
+        self.assertEqual(page_cache.cache.hits, 1)
+        self.client.get(url + '?page=2')
+        self.assertEqual(page_cache.cache.misses, 2)
+
+    def test_writes_invalidate(self):
+        self.assertIn('first title', self.client.get('/post').get_data(as_text=True))
+        self.post.title = 'second title'
+        db.session.commit()
+        self.assertIn('second title', self.client.get('/post').get_data(as_text=True))
+        db.session.add(Post(title='third title', body='body', author=self.user))
+        db.session.commit()
+        self.assertIn('third title', self.client.get('/post').get_data(as_text=True))
+
+    def test_last_seen_does_not_invalidate(self):
+        self.client.get('/post')
+        self.user.ping()
+        db.session.commit()
+        self.client.get('/post')
+        self.assertEqual(page_cache.cache.hits, 1)
+
+    def test_bypass(self):
+        self.client.get('/post')
+        self.client.set_cookie('show_followed', '1')
+        self.client.get('/post')
+        self.client.delete_cookie('show_followed')
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(self.user.id)
+        self.client.get('/post')
+        self.assertEqual(page_cache.cache.hits, 0)
+        self.assertEqual(page_cache.cache.misses, 1)
+
+    def test_stats_require_admin(self):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(self.user.id)
+        self.assertEqual(self.client.get('/do/cache').status_code, 403)
+
+    def test_admin_stats(self):
+        admin = User(email='admin@example.com', name='admin', password='cat', confirmed=True,
+                     role=Role.query.filter_by(name='Administrator').first())
+        db.session.add(admin)
+        db.session.commit()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+        response = self.client.get('/do/cache')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Hit Ratio', response.get_data(as_text=True))
@@ -0,0 +1,106 @@
+import json
+import unittest
+from base64 import b64encode
+from datetime import datetime, timedelta
+
+from app_core import create_app, db
+from app_core.models import Role, Gender, User, Post
+from app_core.pagination import KeysetPagination
+
+
+class PaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['LICMS_POSTS_PER_PAGE'] = 3
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.user = User(email='john@example.com', password='cat', confirmed=True)
+        now = datetime(2024, 1, 1)
+        # posts 4 and 5 share a timestamp so the id has to break the tie
+        stamps = [now + timedelta(minutes=i) for i in (0, 1, 2, 3, 3, 4, 5)]
+        db.session.add_all([Post(title='post %d' % i, body='body', author=self.user, timestamp=stamp)
+                            for i, stamp in enumerate(stamps, 1)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def page(self, cursor=None, page=None):
+        return KeysetPagination(Post.query, (Post.timestamp, Post.id), 3, cursor=cursor, page=page)
+
+    def test_walk_forwards_and_backwards(self):
+        first = self.page()
+        self.assertEqual([p.id for p in first.items], [7, 6, 5])
+        self.assertFalse(first.has_prev)
+        second = self.page(first.next_cursor)
+        self.assertEqual([p.id for p in second.items], [4, 3, 2])
+        third = self.page(second.next_cursor)
+        self.assertEqual([p.id for p in third.items], [1])
+        self.assertFalse(third.has_next)
+        self.assertIsNone(third.next_cursor)
+        back = self.page(third.prev_cursor)
+        self.assertEqual([p.id for p in back.items], [4, 3, 2])
+        back = self.page(back.prev_cursor)
+        self.assertEqual([p.id for p in back.items], [7, 6, 5])
+        self.assertIsNone(back.prev_cursor)
+
+    def test_page_numbers_still_work(self):
+        pagination = self.page(page=2)
+        self.assertEqual([p.id for p in pagination.items], [4, 3, 2])
+        self.assertEqual([p.id for p in self.page(pagination.next_cursor).items], [1])
+        self.assertEqual(pagination.total, 7)
+
+    def test_invalid_cursor_starts_over(self):
+        for cursor in ('garbage', 'WyJuIl0', KeysetPagination.encode_cursor('x', [1, 2])):
+            self.assertEqual([p.id for p in self.page(cursor).items], [7, 6, 5])
+
+    def test_api_links_carry_cursors(self):
+        headers = {
+            'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8'),
+            'Accept': 'application/json'
+        }
+        client = self.app.test_client()
+        seen = []
+        url = '/api/v1/posts/'
+        while url:
+            json_response = json.loads(client.get(url, headers=headers).get_data(as_text=True))
+            seen += [p['title'] for p in json_response['posts']]
+            url = json_response['next']
+            if url:
+                self.assertIn('cursor=', url)
+                self.assertNotIn('page=', url)
+        self.assertEqual(seen, ['post %d' % i for i in range(7, 0, -1)])
+
+    def test_html_listing_links_carry_cursors(self):
+        response = self.app.test_client().get('/post')
+        data = response.get_data(as_text=True)
+        self.assertIn('/post?cursor=', data)
+        self.assertIn('post 5', data)
+        self.assertNotIn('post 4', data)
+
+    def test_deep_page_numbers_are_not_offset(self):
+        self.app.config['LICMS_MAX_PAGE_NUMBER'] = 2
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        headers = {'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8')}
+        client = self.app.test_client()
+        self.assertEqual(len(client.get('/api/v1/posts/?page=2', headers=headers).get_json()['posts']), 3)
+        db.event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = client.get('/api/v1/posts/?page=5000', headers=headers)
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', record)
+        # Refused, not answered with the first page over again, which would never end a walk by page number
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.get_json()['message'])
+        self.assertNotIn('posts', response.get_json())
+        self.assertFalse([statement for statement in statements if 'FROM posts' in statement])
+        self.assertEqual(self.app.test_client().get('/post?page=5000').status_code, 404)
@@ -0,0 +1,77 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from app_core import create_app, db, presence
+from app_core.models import Role, Gender, User
+
+
+class PresenceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['LICMS_LAST_SEEN_RESOLUTION'] = 60
+        self.app.config['LICMS_LAST_SEEN_FLUSH_INTERVAL'] = 10
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.user = User(email='john@example.com', name='john', password='cat', confirmed=True,
+                         gender_id=Gender.query.first().id)
+        db.session.add(self.user)
+        db.session.commit()
+        self.long_ago = datetime(2000, 1, 1)
+        db.session.execute(db.update(User).values(last_seen=self.long_ago))
+        db.session.commit()
+        presence.pending.clear()
+
+    def tearDown(self):
+        presence.pending.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def stored_last_seen(self):
+        return db.session.execute(db.select(User.last_seen).where(User.id == self.user.id)).scalar_one()
+
+    def test_ping_is_buffered(self):
+        self.user.ping()
+        self.assertNotIn(self.user, db.session.dirty)
+        self.assertGreater(self.user.last_seen, self.long_ago)
+        db.session.commit()
+        self.assertEqual(self.stored_last_seen(), self.long_ago)
+        self.assertEqual(presence.flush(), 1)
+        self.assertGreater(self.stored_last_seen(), self.long_ago)
+        self.assertEqual(presence.flush(), 0)
+
+    def test_resolution(self):
+        self.user.ping()
+        presence.flush()
+        first = self.stored_last_seen()
+        self.user.ping()
+        self.assertEqual(presence.flush(), 0)
+        self.assertEqual(self.stored_last_seen(), first)
+        self.user.last_seen = first - timedelta(minutes=2)
+        db.session.commit()
+        self.user.ping()
+        self.assertEqual(presence.flush(), 1)
+
+    def test_requests_flush_when_due(self):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(self.user.id)
+            session['_fresh'] = True
+        self.assertEqual(client.get('/about').status_code, 200)
+        self.assertEqual(self.stored_last_seen(), self.long_ago)
+        presence.flushed_at = time.monotonic() - 10
+        self.assertEqual(client.get('/about').status_code, 200)
+        self.assertGreater(self.stored_last_seen(), self.long_ago)
+        self.assertFalse(presence.pending)
+
+    def test_write_through(self):
+        self.app.config['LICMS_LAST_SEEN_FLUSH_INTERVAL'] = 0
+        self.user.ping()
+        self.assertIn(self.user, db.session.dirty)
+        db.session.commit()
+        self.assertGreater(self.stored_last_seen(), self.long_ago)
+        self.assertFalse(presence.pending)
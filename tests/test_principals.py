@@ -0,0 +1,137 @@
+import unittest
+from base64 import b64encode
+
+from sqlalchemy import event
+
+from app_core import create_app, db
+from app_core.models import Role, Gender, User, Post, Permission
+
+
+class PrincipalCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.user = User(email='john@example.com', name='john', password='cat', confirmed=True,
+                         gender_id=Gender.query.first().id)
+        self.post = Post(title='title', body='body', author=self.user)
+        db.session.add_all([self.user, self.post])
+        db.session.commit()
+        self.token = self.user.generate_auth_token()
+        self.client = self.app.test_client()
+        self.statements = 0
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_statement(self, *args):
+        self.statements += 1
+
+    def headers(self):
+        return {'Authorization': 'Basic ' + b64encode((self.token + ':').encode('utf-8')).decode('utf-8'),
+                'Accept': 'application/json'}
+
+    def get(self, url):
+        db.session.remove()
+        self.statements = 0
+        return self.client.get(url, headers=self.headers())
+
+    def test_cache_hit_needs_no_identity_query(self):
+        url = '/api/v1/posts/%d' % self.post.id
+        self.assertEqual(self.get(url).status_code, 200)
+        cold = self.statements
+        self.assertEqual(self.get(url).status_code, 200)
+        self.assertEqual(self.statements, 1)
+        self.assertLess(self.statements, cold)
+
+    def test_token_claims(self):
+        claims = User.decode_auth_claims(self.token)
+        self.assertEqual(claims['user_id'], self.user.id)
+        self.assertEqual(claims['perm'], self.user.role.permissions)
+        self.assertTrue(claims['cfm'])
+        self.assertEqual(claims['gen'], 0)
+
+    def test_confirmation_change_retires_tokens(self):
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        self.user = db.session.get(User, self.user.id)
+        self.user.confirmed = False
+        db.session.commit()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 401)
+
+    def test_rehash_keeps_tokens(self):
+        self.app.config['LICMS_PASSWORD_METHOD'] = 'pbkdf2:sha256:1000'
+        old_hash = self.user.password_hash
+        response = self.client.get('/api/v1/posts/', headers={
+            'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8')})
+        self.assertEqual(response.status_code, 200)
+        user = db.session.get(User, self.user.id)
+        self.assertNotEqual(user.password_hash, old_hash)
+        self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:1000$'))
+        self.assertEqual(user.token_generation, 0)
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        # The exemption covers that one flush and nothing after it
+        user = db.session.get(User, self.user.id)
+        self.app.config['LICMS_PASSWORD_METHOD'] = 'pbkdf2:sha256:2000'
+        self.assertTrue(user.rehash_password('cat'))
+        db.session.commit()
+        self.assertEqual(db.session.info.get('rehashed_passwords'), {})
+        self.assertEqual(user.token_generation, 0)
+        # A real change of password still retires them
+        user = db.session.get(User, self.user.id)
+        user.password = 'dog'
+        db.session.commit()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 401)
+
+    def test_password_and_role_changes_retire_tokens(self):
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        user = db.session.get(User, self.user.id)
+        user.location = 'Somewhere'
+        db.session.commit()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        user = db.session.get(User, self.user.id)
+        user.password = 'dog'
+        db.session.commit()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 401)
+
+        self.token = db.session.get(User, self.user.id).generate_auth_token()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        user = db.session.get(User, self.user.id)
+        user.role = Role.query.filter_by(name='Moderator').first()
+        db.session.commit()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 401)
+
+        self.token = db.session.get(User, self.user.id).generate_auth_token()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        role = Role.query.filter_by(name='Moderator').first()
+        role.remove_permission(Permission.WRITE)
+        db.session.commit()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 401)
+
+    def test_revoke(self):
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        self.assertEqual(self.client.delete('/api/v1/tokens/', headers=self.headers()).status_code, 204)
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 401)
+        self.token = db.session.get(User, self.user.id).generate_auth_token()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+
+    def test_token_newer_than_cached_generation(self):
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        # Revoked by another worker: this one still caches generation 0
+        db.session.execute(db.update(User).values(token_generation=1))
+        db.session.commit()
+        self.token = db.session.get(User, self.user.id).generate_auth_token()
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+
+    def test_writes_by_principal(self):
+        self.assertEqual(self.get('/api/v1/posts/').status_code, 200)
+        response = self.client.post('/api/v1/posts/', json={'title': 'new', 'body': 'new post'},
+                                    headers=self.headers())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Post.query.filter_by(title='new').first().author_id, self.user.id)
@@ -0,0 +1,54 @@
+import unittest
+
+from sqlalchemy import event
+
+from app_core import create_app, db
+from app_core.models import Role, Gender, User, Post, Comment
+
+
+class ListingQueriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.client = self.app.test_client()
+        self.statements = 0
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_statement(self, *args):
+        self.statements += 1
+
+    def add_activity(self, n):
+        users = [User(email='user%d@example.com' % i, name='user %d' % i, password='cat') for i in range(len(User.query.all()), n)]
+        db.session.add_all(users)
+        db.session.commit()
+        users = User.query.all()
+        post = Post.query.first() or Post(title='title', body='body', author=users[0])
+        db.session.add_all([Post(title='post', body='body', author=u) for u in users] +
+                           [Comment(body='comment', author=u, post=post) for u in users])
+        db.session.commit()
+        return post
+
+    def queries_for(self, url):
+        db.session.remove()
+        self.statements = 0
+        self.assertEqual(self.client.get(url).status_code, 200)
+        return self.statements
+
+    def test_listings_use_constant_queries(self):
+        post = self.add_activity(2)
+        urls = ['/', '/post', '/user', '/post/{}'.format(post.id), '/user/{}'.format(post.author_id),
+                '/followers/{}'.format(post.author_id)]
+        before = {url: self.queries_for(url) for url in urls}
+        self.add_activity(6)
+        for url in urls:
+            self.assertEqual(self.queries_for(url), before[url], url)
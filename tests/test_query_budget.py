@@ -0,0 +1,136 @@
+import unittest
+from base64 import b64encode
+from datetime import datetime, timedelta
+
+from app_core import create_app, db, budgets
+from app_core.exceptions import QueryBudgetExceeded
+from app_core.models import Role, Gender, User, Post, Comment, Paste
+
+ROWS = 12
+
+
+class QueryBudgetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.seed()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def seed(self):
+        admin = Role.query.filter_by(name='Administrator').first()
+        gender = Gender.query.first()
+        self.admin = User(email='admin@example.com', name='admin', password='cat', confirmed=True, role=admin,
+                          gender_id=gender.id)
+        users = [User(email='user%d@example.com' % i, name='user %d' % i, password='cat', confirmed=True,
+                      gender_id=gender.id) for i in range(ROWS)]
+        db.session.add_all([self.admin] + users)
+        db.session.commit()
+        for u in users:
+            self.admin.follow(u)
+            u.follow(self.admin)
+        self.post = Post(title='title', body='body', author=self.admin)
+        db.session.add(self.post)
+        expiry = datetime.now() + timedelta(days=1)
+        for u in users:
+            db.session.add(Post(title='post by %s' % u.name, body='*body*', author=u))
+            db.session.add(Comment(body='comment by %s' % u.name, author=u, post=self.post))
+            db.session.add(Paste(title='paste', body='paste', author=self.admin, expiry=expiry))
+        db.session.commit()
+        self.comment = self.post.comments.first()
+        self.paste = Paste.query.first()
+        self.user = users[0]
+
+    def login(self):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(self.admin.id)
+            session['_fresh'] = True
+
+    @staticmethod
+    def api_headers():
+        return {
+            'Authorization': 'Basic ' + b64encode(b'admin@example.com:cat').decode('utf-8'),
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'
+        }
+
+    def requests(self):
+        # (endpoint, method, url, json body) for every route in main and api
+        a, u, p, c, s = self.admin.id, self.user.id, self.post.id, self.comment.id, self.paste.id
+        return [
+            ('main.favicon', 'GET', '/favicon.ico', None),
+            ('main.index', 'GET', '/', None),
+            ('main.users', 'GET', '/user', None),
+            ('main.user', 'GET', '/user/%d' % u, None),
+            ('main.edit_profile', 'GET', '/user/edit', None),
+            ('main.edit_profile_admin', 'GET', '/user/%d/edit' % u, None),
+            ('main.show_all', 'GET', '/all/main.index', None),
+            ('main.show_followed', 'GET', '/followed/main.index', None),
+            ('main.posts', 'GET', '/post', None),
+            ('main.post', 'GET', '/post/%d' % p, None),
+            ('main.edit', 'GET', '/post/%d/edit' % p, None),
+            ('main.unfollow', 'POST', '/unfollow/%d' % u, None),
+            ('main.follow', 'POST', '/follow/%d' % u, None),
+            ('main.followers', 'GET', '/followers/%d' % a, None),
+            ('main.followed_by', 'GET', '/followed_by/%d' % a, None),
+            ('main.about', 'GET', '/about', None),
+            ('main.moderate', 'GET', '/moderate', None),
+            ('main.moderate_disable', 'GET', '/moderate/disable/%d' % c, None),
+            ('main.moderate_enable', 'GET', '/moderate/enable/%d' % c, None),
+            ('main.pastes', 'GET', '/paste', None),
+            ('main.paste', 'GET', '/paste/%d' % s, None),
+            ('main.edit_paste', 'GET', '/paste/edit/%d' % s, None),
+            ('main.moderate_pastes', 'GET', '/paste/moderate', None),
+            ('main.moderate_disable_paste', 'GET', '/paste/moderate/disable/%d' % s, None),
+            ('main.moderate_enable_paste', 'GET', '/paste/moderate/enable/%d' % s, None),
+            ('api.get_token', 'POST', '/api/v1/tokens/', None),
+            ('api.get_posts', 'GET', '/api/v1/posts/', None),
+            ('api.get_post', 'GET', '/api/v1/posts/%d' % p, None),
+            ('api.new_post', 'POST', '/api/v1/posts/', {'title': 'new', 'body': 'new post'}),
+            ('api.edit_post', 'PUT', '/api/v1/posts/%d' % p, {'body': 'edited'}),
+            ('api.get_user', 'GET', '/api/v1/users/%d' % u, None),
+            ('api.get_user_posts', 'GET', '/api/v1/users/%d/posts/' % u, None),
+            ('api.get_user_followed_posts', 'GET', '/api/v1/users/%d/timeline/' % a, None),
+            ('api.get_comments', 'GET', '/api/v1/comments/', None),
+            ('api.get_comment', 'GET', '/api/v1/comments/%d' % c, None),
+            ('api.get_post_comments', 'GET', '/api/v1/posts/%d/comments/' % p, None),
+            ('api.new_post_comment', 'POST', '/api/v1/posts/%d/comments/' % p, {'body': 'new comment'}),
+            ('api.new_posts', 'POST', '/api/v1/posts/batch', [{'title': 'a', 'body': 'a'}, {'title': 'b', 'body': 'b'}]),
+            ('api.new_post_comments', 'POST', '/api/v1/posts/%d/comments/batch' % p, [{'body': 'a'}, {'body': 'b'}]),
+            ('api.export', 'GET', '/api/v1/export/posts.ndjson', None),
+            ('api.revoke_tokens', 'DELETE', '/api/v1/tokens/', None),
+        ]
+
+    def test_every_route_has_a_budget(self):
+        endpoints = {rule.endpoint for rule in self.app.url_map.iter_rules()
+                     if rule.endpoint.split('.')[0] in ('main', 'api')}
+        self.assertEqual(endpoints, {endpoint for endpoint, _, _, _ in self.requests()})
+        for endpoint in endpoints:
+            self.assertIsNotNone(budgets.budget_for(endpoint), endpoint)
+
+    def test_routes_stay_within_budget(self):
+        self.login()
+        for endpoint, method, url, body in self.requests():
+            headers = self.api_headers() if endpoint.startswith('api.') else None
+            # start every request from an empty identity map, as a real one would
+            db.session.remove()
+            # an overage raises QueryBudgetExceeded out of the test client
+            response = self.client.open(url, method=method, json=body, headers=headers)
+            self.assertLess(response.status_code, 400, endpoint)
+
+    def test_overage(self):
+        self.app.config['LICMS_QUERY_BUDGETS'] = {'main.users': 0}
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/user')
+        self.app.config['LICMS_QUERY_BUDGET_MODE'] = 'log'
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.assertEqual(self.client.get('/user').status_code, 200)
+        self.assertIn('main.users', logs.output[0])
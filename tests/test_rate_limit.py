@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+from base64 import b64encode
+
+from app_core import create_app, db, limiter
+from app_core.models import Role, Gender, User
+from app_core.rate_limit import RateLimiter
+
+
+class RateLimitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_sliding_window(self):
+        start = 6000.0
+        for i in range(3):
+            self.assertIsNone(limiter.hit('k', 3, 60, now=start + i))
+        wait = limiter.hit('k', 3, 60, now=start + 3)
+        self.assertAlmostEqual(wait, 57)
+        self.assertIsNone(limiter.hit('k', 3, 60, now=start + 3 + wait + 1))
+        self.assertIsNone(limiter.hit('other', 3, 60, now=start + 3))
+        # 10s into the next window 5/6 of the previous one still counts, 2.5 + 1 is over the limit until 20s in
+        wait = limiter.hit('k', 3, 60, now=start + 70)
+        self.assertAlmostEqual(wait, 10)
+        self.assertIsNotNone(limiter.hit('k', 3, 60, now=start + 70 + wait - 1))
+        self.assertIsNone(limiter.hit('k', 3, 60, now=start + 70 + wait + 1))
+
+    def test_shared_between_processes(self):
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        try:
+            workers = [RateLimiter(), RateLimiter()]
+            for worker in workers:
+                worker.store = path
+            self.assertIsNone(workers[0].hit('k', 2, 60, now=60))
+            self.assertIsNone(workers[1].hit('k', 2, 60, now=61))
+            self.assertIsNotNone(workers[0].hit('k', 2, 60, now=62))
+            for worker in workers:
+                worker.connection().close()
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def test_store_is_private_and_keys_hashed(self):
+        directory = tempfile.mkdtemp()
+        try:
+            worker = RateLimiter()
+            worker.store = os.path.join(directory, 'instance', 'limits.sqlite')
+            worker.secret = b'secret'
+            self.assertIsNone(worker.hit(worker.digest('api.password:basic_auth_email:john@example.com'), 2, 60))
+            self.assertEqual(os.stat(worker.store).st_mode & 0o777, 0o600)
+            self.assertEqual(os.stat(os.path.dirname(worker.store)).st_mode & 0o777, 0o700)
+            keys = [key for key, in worker.connection().execute('SELECT key FROM rate_limit_windows')]
+            self.assertEqual(len(keys), 1)
+            self.assertNotIn('john@example.com', keys[0])
+            worker.connection().close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_sweep(self):
+        for i in range(50):
+            self.assertIsNone(limiter.hit('token %d' % i, 3, 60, now=600 + i))
+        self.assertIsNone(limiter.hit('k', 3, 900, now=600))
+        # The previous window still counts for the next 60s, after that only the 900s one is left
+        limiter.next_sweep = 0
+        self.assertIsNone(limiter.hit('late', 3, 60, now=700))
+        self.assertEqual(limiter.connection().execute('SELECT count(*) FROM rate_limit_windows').fetchone()[0], 52)
+        limiter.next_sweep = 0
+        self.assertIsNone(limiter.hit('late', 3, 60, now=781))
+        keys = {key for key, in limiter.connection().execute('SELECT key FROM rate_limit_windows')}
+        self.assertEqual(keys, {'k', 'late'})
+
+    def test_login(self):
+        for i in range(10):
+            response = self.client.post('/auth/login', data={'email': 'john%d@example.com' % i, 'password': 'x'})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post('/auth/login', data={'email': 'jane@example.com', 'password': 'x'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+        self.assertIn('Too Many', response.get_data(as_text=True))
+        # Only submissions are counted
+        self.assertEqual(self.client.get('/auth/login').status_code, 200)
+
+    def test_login_by_email(self):
+        self.app.config['LICMS_RATE_LIMITS'] = {'auth.login': (2, 60)}
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            response = self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'x'},
+                                        environ_base={'REMOTE_ADDR': ip})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post('/auth/login', data={'email': 'John@example.com', 'password': 'x'},
+                                    environ_base={'REMOTE_ADDR': '10.0.0.3'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_api(self):
+        self.app.config['LICMS_RATE_LIMITS'] = {'api.password': (2, 60)}
+        headers = {'Authorization': 'Basic ' + b64encode(b'nobody@example.com:wrong').decode('utf-8'),
+                   'Accept': 'application/json'}
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/v1/posts/', headers=headers).status_code, 401)
+        response = self.client.get('/api/v1/posts/', headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.get_json()['error'], 'too many requests')
+        self.assertIn('Retry-After', response.headers)
+
+    def test_api_verified_calls_are_not_throttled(self):
+        self.app.config['LICMS_RATE_LIMITS'] = {'api.password': (1, 60)}
+        user = User(email='john@example.com', name='john', password='cat', confirmed=True,
+                    gender_id=Gender.query.first().id)
+        db.session.add(user)
+        db.session.commit()
+        headers = {'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8'),
+                   'Accept': 'application/json'}
+        # The first call runs the KDF and counts, the cached ones after it don't
+        for _ in range(5):
+            self.assertEqual(self.client.get('/api/v1/posts/', headers=headers).status_code, 200)
+        headers['Authorization'] = 'Basic ' + b64encode(b'john@example.com:dog').decode('utf-8')
+        self.assertEqual(self.client.get('/api/v1/posts/', headers=headers).status_code, 429)
@@ -0,0 +1,68 @@
+import unittest
+
+from sqlalchemy import event
+
+from app_core import create_app, db, reference
+from app_core.main.forms import EditProfileAdminForm
+from app_core.models import Role, Gender, User, Permission
+
+
+class ReferenceDataTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.statements = 0
+        self.executed = []
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_statement(self, conn, cursor, statement, *args):
+        self.statements += 1
+        self.executed.append(statement)
+
+    def test_permission_checks_need_no_queries(self):
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        u = db.session.get(User, u.id)
+        self.statements = 0
+        self.assertTrue(u.can(Permission.WRITE))
+        self.assertFalse(u.can(Permission.MODERATE))
+        self.assertFalse(u.is_administrator())
+        self.assertEqual(self.statements, 0)
+
+    def test_default_role_and_choices_need_no_queries(self):
+        reference.get()
+        self.executed = []
+        u = User(email='john@example.com', password='cat')
+        self.assertFalse([statement for statement in self.executed if 'FROM roles' in statement])
+        self.assertEqual(u.role_id, Role.query.filter_by(default=True).first().id)
+        self.statements = 0
+        with self.app.test_request_context('/'):
+            form = EditProfileAdminForm(user=u)
+        self.assertEqual(self.statements, 0)
+        self.assertEqual([name for _, name in form.role.choices], ['Administrator', 'Moderator', 'User'])
+        self.assertEqual(len(form.gender.choices), Gender.query.count())
+
+    def test_committed_changes_reload(self):
+        u = User(email='john@example.com', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        self.assertTrue(u.can(Permission.WRITE))
+        u.role.remove_permission(Permission.WRITE)
+        db.session.commit()
+        self.assertFalse(u.can(Permission.WRITE))
+        Role.insert_roles()
+        self.assertTrue(u.can(Permission.WRITE))
+        db.session.add(Gender(name='Other'))
+        db.session.commit()
+        self.assertIn('Other', [name for _, name in reference.gender_choices()])
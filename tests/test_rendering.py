@@ -0,0 +1,202 @@
+import unittest
+
+from markdown import markdown
+from sqlalchemy import update
+
+from app_core import create_app, db, renderer
+from app_core.models import Role, Gender, User, Post, Comment
+from app_core.rendering import PROFILES, RenderState, get_engine, make_excerpt, render_markdown, rerender_stale
+
+
+class RenderingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        renderer.cache.clear()
+        renderer.highlight_cache.clear()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_identical_bodies_hit_cache(self):
+        p1 = Post(title='first', body='body of the *blog* post')
+        self.assertEqual(renderer.cache.misses, 1)
+        p2 = Post(title='second', body='body of the *blog* post')
+        self.assertEqual(renderer.cache.hits, 1)
+        self.assertEqual(p1.body_html, '<p>body of the <em>blog</em> post</p>')
+        self.assertEqual(p1.body_html, p2.body_html)
+
+    def test_resubmitted_body_hits_cache(self):
+        u = User(email='john@example.com', password='cat')
+        p = Post(title='title', body='unchanged body', author=u)
+        db.session.add(p)
+        db.session.commit()
+        p.body = 'unchanged body'
+        db.session.commit()
+        self.assertEqual(renderer.cache.misses, 1)
+        self.assertEqual(renderer.cache.hits, 1)
+
+    def test_allowed_tags_are_part_of_the_key(self):
+        p = Post(title='title', body='# heading')
+        c = Comment(body='# heading')
+        self.assertEqual(renderer.cache.misses, 2)
+        self.assertIn('<h1', p.body_html)
+        self.assertNotIn('<h1', c.body_html)
+
+    def test_cache_is_bounded(self):
+        renderer.cache.maxsize = 2
+        for i in range(5):
+            Comment(body='comment number %d' % i)
+        self.assertEqual(len(renderer.cache), 2)
+        Comment(body='comment number 4')
+        self.assertEqual(renderer.cache.hits, 1)
+        Comment(body='comment number 0')
+        self.assertEqual(renderer.cache.misses, 6)
+
+    def test_render_version_is_recorded(self):
+        p = Post(title='title', body='body')
+        c = Comment(body='body')
+        self.assertIsNotNone(p.render_version)
+        self.assertIsNotNone(c.render_version)
+        self.assertNotEqual(p.render_version, c.render_version)
+
+    def test_rerender_stale_rows(self):
+        u = User(email='john@example.com', password='cat')
+        posts = [Post(title='post %d' % i, body='post *%d*' % i, author=u) for i in range(7)]
+        db.session.add_all(posts)
+        db.session.commit()
+        db.session.execute(update(Post).where(Post.id <= 3).values(body_html='stale', render_version=None))
+        db.session.execute(update(Post).where(Post.id == 5).values(body_html='stale', render_version='outdated'))
+        db.session.commit()
+        self.assertEqual(rerender_stale(db.session, Post, chunk_size=2, processes=1), 4)
+        self.assertEqual(Post.query.filter_by(body_html='stale').count(), 0)
+        self.assertEqual(db.session.get(Post, 5).body_html, '<p>post <em>4</em></p>')
+        # a finished run leaves nothing behind for the next one
+        self.assertEqual(rerender_stale(db.session, Post, chunk_size=2, processes=1), 0)
+
+    def test_rerender_in_process_pool(self):
+        u = User(email='john@example.com', password='cat')
+        p = Post(title='title', body='body', author=u)
+        comments = [Comment(body='comment *%d*' % i, author=u, post=p) for i in range(9)]
+        db.session.add_all(comments)
+        db.session.commit()
+        db.session.execute(update(Comment).values(body_html='stale', render_version=None))
+        db.session.commit()
+        self.assertEqual(rerender_stale(db.session, Comment, chunk_size=2, processes=2), 9)
+        self.assertEqual(Comment.query.filter_by(body_html='stale').count(), 0)
+        self.assertEqual(db.session.get(Comment, 9).body_html, 'comment <em>8</em>')
+
+    def test_engine_is_reused_and_reset(self):
+        extensions = self.app.config['LICMS_MARKDOWN_EXTENSIONS']
+        engine = get_engine(PROFILES['post'], extensions)
+        self.assertIs(get_engine(PROFILES['post'], extensions), engine)
+        self.assertIsNot(get_engine(PROFILES['comment'], extensions), engine)
+        first = render_markdown('text[^1]\n\n[^1]: a footnote', extensions, PROFILES['post'])
+        second = render_markdown('plain text', extensions, PROFILES['post'])
+        self.assertIn('a footnote', first)
+        self.assertNotIn('a footnote', second)
+
+    def test_large_post_is_rendered_in_background(self):
+        self.app.config['LICMS_ASYNC_RENDER_THRESHOLD'] = 100
+        u = User(email='john@example.com', password='cat')
+        p = Post(title='title', body='*large* body ' * 20, author=u)
+        self.assertTrue(p.is_rendering)
+        self.assertIsNone(p.body_html)
+        db.session.add(p)
+        db.session.commit()
+        # Nothing renders it in the web process
+        self.assertEqual(p.render_state, RenderState.PENDING)
+        self.assertEqual(Post.render_all_pending(batch_size=1), 1)
+        db.session.refresh(p)
+        self.assertEqual(p.render_state, RenderState.READY)
+        self.assertTrue(p.body_html.startswith('<p><em>large</em> body'))
+        self.assertIsNotNone(p.render_version)
+        self.assertEqual(Post.render_all_pending(), 0)
+
+    def test_orphaned_pending_posts_are_rendered(self):
+        self.app.config['LICMS_ASYNC_RENDER_THRESHOLD'] = 100
+        u = User(email='john@example.com', password='cat')
+        posts = [Post(title='title', body='*large* body %d ' % i * 20, author=u) for i in range(3)]
+        db.session.add_all(posts)
+        db.session.commit()
+        post_ids = [p.id for p in posts]
+        # Left pending by processes that are long gone, they are still picked up by the next poll
+        db.session.remove()
+        self.assertEqual(Post.render_all_pending(batch_size=2), 3)
+        self.assertEqual({db.session.get(Post, post_id).render_state for post_id in post_ids}, {RenderState.READY})
+
+    def test_pending_post_shows_placeholder(self):
+        self.app.config['LICMS_ASYNC_RENDER_THRESHOLD'] = 100
+        u = User(email='john@example.com', password='cat')
+        p = Post(title='title', body='*large* body ' * 20, author=u)
+        small = Post(title='title', body='*small* body', author=u)
+        self.assertEqual(small.render_state, RenderState.READY)
+        db.session.add_all([p, small])
+        db.session.commit()
+        response = self.app.test_client().get('/post/{}'.format(p.id))
+        self.assertIn('still being prepared', response.get_data(as_text=True))
+        Post.render_pending(p.id)
+        response = self.app.test_client().get('/post/{}'.format(p.id))
+        self.assertIn('<em>large</em>', response.get_data(as_text=True))
+
+    def test_code_blocks_hit_highlight_cache(self):
+        blocks = ''.join('```python\ndef f%d():\n    return %d\n```\n\n' % (i, i) for i in range(3))
+        p = Post(title='title', body='first draft\n\n' + blocks + '    indented = True\n')
+        self.assertEqual(renderer.highlight_cache.misses, 4)
+        self.assertEqual(renderer.highlight_cache.hits, 0)
+        p.body = 'second draft\n\n' + blocks + '    indented = True\n'
+        self.assertEqual(renderer.highlight_cache.misses, 4)
+        self.assertEqual(renderer.highlight_cache.hits, 4)
+        self.assertIn('def f2():', p.body_html)
+
+    def test_highlight_cache_keeps_output_identical(self):
+        body = 'text\n\n```python\nprint("<b>")\n```\n\n```\n#!python\nx = 1\n```\n'
+        extensions = self.app.config['LICMS_MARKDOWN_EXTENSIONS']
+        renderer.highlight_cache.maxsize = 0
+        uncached = render_markdown(body, extensions, PROFILES['post'])
+        renderer.highlight_cache.maxsize = 16
+        self.assertEqual(render_markdown(body, extensions, PROFILES['post']), uncached)
+        self.assertEqual(render_markdown(body, extensions, PROFILES['post']), uncached)
+        self.assertEqual(renderer.highlight_cache.hits, 2)
+
+    def test_library_markdown_is_left_alone(self):
+        body = 'text\n\n```python\nprint("<b>")\n```\n\n    :::python\n    x = 1\n'
+        extensions = self.app.config['LICMS_MARKDOWN_EXTENSIONS']
+        plain = markdown(body, extensions=extensions, output_format='html')
+        self.assertEqual(renderer.highlight_cache.misses, 0)
+        self.assertEqual(renderer.highlight_cache.hits, 0)
+        md, _, _ = get_engine(PROFILES['post'], extensions)
+        md.reset()
+        self.assertEqual(md.convert(body), plain)
+        self.assertEqual(renderer.highlight_cache.misses, 2)
+
+    def test_excerpt(self):
+        p = Post(title='title', body='# Heading\n\nSome *text* & [a link](https://example.com).')
+        self.assertEqual(p.excerpt, 'Heading Some text & a link.')
+        self.assertEqual(make_excerpt('<p>one two three</p>', 9), 'one two\u2026')
+        self.assertEqual(make_excerpt('<p>onetwothree</p>', 6), 'onetwo\u2026')
+
+    def test_listing_defers_body(self):
+        u = User(email='john@example.com', password='cat')
+        db.session.add(Post(title='title', body='body', author=u))
+        db.session.commit()
+        db.session.expunge_all()
+        p = Post.query.options(*Post.without_body()).first()
+        self.assertEqual(p.excerpt, 'body')
+        self.assertNotIn('body', p.__dict__)
+        self.assertNotIn('body_html', p.__dict__)
+
+    def test_rerender_backfills_excerpts(self):
+        u = User(email='john@example.com', password='cat')
+        db.session.add(Post(title='title', body='*body*', author=u))
+        db.session.commit()
+        db.session.execute(update(Post).values(excerpt=None))
+        db.session.commit()
+        self.assertEqual(rerender_stale(db.session, Post, processes=1), 1)
+        self.assertEqual(Post.query.first().excerpt, 'body')
@@ -0,0 +1,135 @@
+import unittest
+
+from app_core import create_app, db
+from app_core.models import Role, Gender, User, Post, TimelineEntry
+
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['LICMS_TIMELINE_ENABLED'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def make_user(self, email):
+        u = User(email=email, password='cat')
+        db.session.add(u)
+        db.session.commit()
+        return u
+
+    def test_posts_fan_out_to_followers(self):
+        u1 = self.make_user('john@example.com')
+        u2 = self.make_user('susan@example.com')
+        u1.follow(u2)
+        p = Post(title='title', body='body', author=u2)
+        db.session.add(p)
+        db.session.commit()
+        self.assertEqual(TimelineEntry.query.filter_by(user_id=u1.id, post_id=p.id).count(), 1)
+        # authors follow themselves, so their own posts land in their timeline as well
+        self.assertEqual(TimelineEntry.query.filter_by(user_id=u2.id, post_id=p.id).count(), 1)
+        self.assertEqual(u1.followed_posts.all(), [p])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        self.app.config['LICMS_TIMELINE_BATCH_SIZE'] = 2
+        self.app.config['LICMS_TIMELINE_BACKFILL'] = 3
+        u1 = self.make_user('john@example.com')
+        u2 = self.make_user('susan@example.com')
+        db.session.add_all([Post(title='post %d' % i, body='body', author=u2) for i in range(5)])
+        db.session.commit()
+        u1.follow(u2)
+        self.assertEqual(TimelineEntry.query.filter_by(user_id=u1.id).count(), 3)
+        self.assertEqual(u1.followed_posts.count(), 3)
+        u1.unfollow(u2)
+        self.assertEqual(TimelineEntry.query.filter_by(user_id=u1.id).count(), 0)
+        self.assertEqual(TimelineEntry.query.filter_by(user_id=u2.id).count(), 5)
+
+    def test_popular_authors_are_pulled(self):
+        self.app.config['LICMS_TIMELINE_FANOUT_LIMIT'] = 2
+        u1 = self.make_user('john@example.com')
+        u2 = self.make_user('susan@example.com')
+        u3 = self.make_user('david@example.com')
+        u1.follow(u3)
+        u2.follow(u3)
+        own = Post(title='own', body='body', author=u1)
+        p = Post(title='title', body='body', author=u3)
+        db.session.add_all([own, p])
+        db.session.commit()
+        self.assertTrue(u3.timeline_pull)
+        self.assertEqual(TimelineEntry.query.filter_by(post_id=p.id).count(), 0)
+        self.assertEqual(set(u1.followed_posts.all()), {own, p})
+        self.assertEqual(u2.followed_posts.all(), [p])
+
+    def test_rebuild(self):
+        u1 = self.make_user('john@example.com')
+        u2 = self.make_user('susan@example.com')
+        u1.follow(u2)
+        db.session.add(Post(title='title', body='body', author=u2))
+        db.session.commit()
+        db.session.execute(db.delete(TimelineEntry))
+        db.session.commit()
+        TimelineEntry.rebuild()
+        self.assertEqual(TimelineEntry.query.count(), 2)
+        self.assertEqual(u1.followed_posts.count(), 1)
+
+    def test_disabled_timeline_joins_follows(self):
+        self.app.config['LICMS_TIMELINE_ENABLED'] = False
+        u1 = self.make_user('john@example.com')
+        u2 = self.make_user('susan@example.com')
+        u1.follow(u2)
+        db.session.add(Post(title='title', body='body', author=u2))
+        db.session.commit()
+        self.assertEqual(TimelineEntry.query.count(), 0)
+        self.assertEqual(u1.followed_posts.count(), 1)
+
+    def test_reads_scan_the_timeline_index(self):
+        u1 = self.make_user('john@example.com')
+        u2 = self.make_user('susan@example.com')
+        u1.follow(u2)
+        db.session.add_all([Post(title='post %d' % i, body='body', author=u2) for i in range(3)])
+        db.session.commit()
+        statements = []
+
+        def record(conn, cursor, statement, parameters, *args):
+            statements.append((statement, parameters))
+
+        self.assertFalse(u1.follows_pulled)
+        db.event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            posts = u1.followed_posts.order_by(*[column.desc() for column in u1.followed_posts_order]).limit(2).all()
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual([p.title for p in posts], ['post 2', 'post 1'])
+        # No lookup of pulled authors, and no sort of the whole timeline
+        self.assertEqual(len(statements), 1)
+        statement, parameters = statements[0]
+        plan = ' '.join(row[3] for row in db.session.connection().exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + statement, parameters))
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_follows_pulled(self):
+        self.app.config['LICMS_TIMELINE_FANOUT_LIMIT'] = 1
+        u1 = self.make_user('john@example.com')
+        u2 = self.make_user('susan@example.com')
+        u3 = self.make_user('david@example.com')
+        u1.follow(u3)
+        self.assertFalse(u1.follows_pulled)
+        # u3 follows itself as well, so this is over the limit
+        db.session.add(Post(title='title', body='body', author=u3))
+        db.session.commit()
+        self.assertTrue(u1.follows_pulled)
+        u2.follow(u3)
+        self.assertTrue(u2.follows_pulled)
+        self.assertEqual(u2.followed_posts_order, (Post.timestamp, Post.id))
+        u2.unfollow(u3)
+        self.assertFalse(u2.follows_pulled)
+        self.assertEqual(u2.followed_posts_order, (TimelineEntry.timestamp, TimelineEntry.post_id))
+        TimelineEntry.rebuild()
+        self.assertTrue(db.session.get(User, u1.id).follows_pulled)
@@ -0,0 +1,69 @@
+import json
+import time
+import unittest
+from base64 import b64encode
+
+from app_core import create_app, db, totals
+from app_core.cache import LRUCache
+from app_core.models import Role, Gender, User, Post, Comment
+
+
+class TotalsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        Gender.insert_genders()
+        self.user = User(email='john@example.com', password='cat', confirmed=True)
+        self.post = Post(title='title', body='body', author=self.user)
+        db.session.add_all([Comment(body='comment %d' % i, author=self.user, post=self.post) for i in range(3)])
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.headers = {
+            'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8'),
+            'Accept': 'application/json'
+        }
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get_count(self, url):
+        return json.loads(self.client.get(url, headers=self.headers).get_data(as_text=True))['count']
+
+    def test_count_is_cached(self):
+        self.assertEqual(self.get_count('/api/v1/comments/'), 3)
+        misses = totals.cache.misses
+        self.assertEqual(self.get_count('/api/v1/comments/'), 3)
+        self.assertEqual(totals.cache.misses, misses)
+        self.assertEqual(totals.cache.hits, 1)
+
+    def test_commit_invalidates_count(self):
+        url = '/api/v1/posts/{}/comments/'.format(self.post.id)
+        self.assertEqual(self.get_count(url), 3)
+        db.session.add(Comment(body='one more', author=self.user, post=self.post))
+        db.session.flush()
+        self.assertEqual(self.get_count(url), 3)
+        db.session.commit()
+        self.assertEqual(self.get_count(url), 4)
+        self.assertEqual(self.get_count('/api/v1/comments/'), 4)
+
+    def test_exact_bypasses_cache(self):
+        self.assertEqual(self.get_count('/api/v1/posts/'), 1)
+        # writes that skip the ORM are only picked up once the TTL runs out, or on request
+        db.session.execute(db.delete(Post))
+        db.session.commit()
+        self.assertEqual(self.get_count('/api/v1/posts/'), 1)
+        self.assertEqual(self.get_count('/api/v1/posts/?exact=1'), 0)
+        self.assertEqual(self.get_count('/api/v1/posts/'), 0)
+
+    def test_cache_ttl(self):
+        cache = LRUCache(ttl=0.05)
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        time.sleep(0.1)
+        self.assertNotIn('key', cache)
+        self.assertIsNone(cache.get('key'))